@@ -0,0 +1,271 @@
+"""
+Benchmark indexing and searching on synthetic projects.
+
+Generates a project and a fake site-packages directory of configurable size,
+then measures cold and warm indexing, incremental updates, search latency,
+peak memory and database size. Results are written as JSON so runs on
+different commits can be compared.
+
+    python benchmarks/bench_autoimport.py --files 200 --output results.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from autoimport_core import AutoImport, MemoryBackend
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+
+def make_name(rng: random.Random, length: int = 10) -> str:
+    return rng.choice(string.ascii_letters) + "".join(
+        rng.choice(string.ascii_letters + string.digits + "_")
+        for _ in range(length - 1)
+    )
+
+
+def write_module(path: Path, names: list[str]) -> None:
+    lines = []
+    for index, name in enumerate(names):
+        kind = index % 3
+        if kind == 0:
+            lines.append(f"def {name}(arg):\n    return arg\n")
+        elif kind == 1:
+            lines.append(f"class {name}:\n    attribute = 1\n")
+        else:
+            lines.append(f"{name} = {index}\n")
+    path.write_text("\n".join(lines))
+
+
+def generate_tree(
+    root: Path, rng: random.Random, files: int, names: int, depth: int
+) -> list[str]:
+    """Generate files spread over nested packages. Returns all the names."""
+    all_names = []
+    directories = [root]
+    for level in range(depth):
+        directory = directories[-1] / f"sub{level}"
+        directory.mkdir()
+        (directory / "__init__.py").touch()
+        directories.append(directory)
+    for index in range(files):
+        module_names = [make_name(rng) for _ in range(names)]
+        all_names.extend(module_names)
+        write_module(
+            directories[index % len(directories)] / f"mod{index}.py", module_names
+        )
+    return all_names
+
+
+def generate_site_packages(
+    root: Path, rng: random.Random, packages: int, files: int, names: int
+) -> list[str]:
+    """
+    Generate fake installed packages. Returns the package names.
+
+    Only the top level modules of packages are indexed, so there are no subpackages.
+    """
+    package_names = []
+    for index in range(packages):
+        package_name = f"fakepkg{index}"
+        package = root / package_name
+        package.mkdir(parents=True)
+        (package / "__init__.py").touch()
+        generate_tree(package, rng, files, names, 0)
+        package_names.append(package_name)
+    return package_names
+
+
+def timed(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+
+    def percentile(percent: float) -> float:
+        index = min(int(len(ordered) * percent / 100), len(ordered) - 1)
+        return ordered[index]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+        "max": ordered[-1],
+    }
+
+
+def measure_searches(
+    importer: AutoImport, queries: list[str], exact_match: bool
+) -> dict[str, float]:
+    samples = []
+    for query in queries:
+        # Measure the queries themselves, not the result cache
+        importer._search_cache.invalidate()
+        samples.append(timed(lambda: importer.search(query, exact_match)))
+    return percentiles(samples)
+
+
+def peak_rss() -> dict[str, int] | None:
+    """Peak resident memory in bytes, of this process and of the workers."""
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+def get_commit() -> str | None:
+    try:
+        return (
+            subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                cwd=Path(__file__).parent,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            )
+            .stdout.decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace, workdir: Path) -> dict[str, Any]:
+    rng = random.Random(args.seed)
+    project = workdir / "project"
+    project.mkdir()
+    site_packages = workdir / "site-packages"
+    generate_tree(project, rng, args.files, args.names, args.depth)
+    package_names = generate_site_packages(
+        site_packages, rng, args.packages, args.package_files, args.names
+    )
+    sys.path.insert(0, str(site_packages))
+    project_files = sorted(project.rglob("*.py"))
+    index: Path | None = workdir / "index.db"
+    backend = None
+    if args.backend == "memory":
+        # Its names don't outlive the process, so neither can the index
+        backend = MemoryBackend()
+        index = None
+    importer = AutoImport(
+        project, index=None if index is None else str(index), backend=backend
+    )
+    results: dict[str, Any] = {}
+
+    def index_all() -> None:
+        importer._generate_cache(
+            files=project_files,
+            single_thread=args.single_thread,
+            sharded=args.sharded,
+        )
+        importer._generate_cache(
+            package_names=package_names,
+            single_thread=args.single_thread,
+            sharded=args.sharded,
+        )
+
+    results["index_cold"] = timed(index_all)
+    results["index_metrics"] = {
+        "phases": importer.metrics.indexing.phases,
+        "modules_per_second": importer.metrics.indexing.modules_per_second,
+        "names_per_second": importer.metrics.indexing.names_per_second,
+        "slowest_modules": importer.metrics.indexing.slowest_modules,
+    }
+    # Generate the cache again with nothing changed: the indexed packages
+    # are skipped, so this is the cost of an incremental generate_cache
+
+    def index_packages() -> None:
+        importer._generate_cache(
+            package_names=package_names,
+            single_thread=args.single_thread,
+            sharded=args.sharded,
+        )
+
+    results["index_warm"] = timed(index_packages)
+    results["db_size"] = None if index is None else index.stat().st_size
+
+    update_samples = []
+    for path in rng.sample(project_files, min(args.updates, len(project_files))):
+        write_module(path, [make_name(rng) for _ in range(args.names)])
+        update_samples.append(timed(lambda: importer.update_path(path)))
+    results["update_path"] = percentiles(update_samples)
+
+    # The names which are indexed, so the updated modules' are the new ones
+    all_names = sorted({name.name for name in importer._dump_all()[0]})
+    known = rng.sample(all_names, min(args.searches, len(all_names)))
+    results["search_prefix"] = measure_searches(
+        importer, [name[: rng.randint(1, 3)] for name in known], False
+    )
+    results["search_exact"] = measure_searches(importer, known, True)
+    results["search_exact_miss"] = measure_searches(
+        importer, [make_name(rng) for _ in known], True
+    )
+    results["search_module"] = measure_searches(
+        importer, [f"mod{rng.randrange(args.files)}" for _ in known], False
+    )
+    results["peak_rss"] = peak_rss()
+    importer.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=200, help="project files")
+    parser.add_argument("--names", type=int, default=50, help="names per file")
+    parser.add_argument("--depth", type=int, default=3, help="project nesting depth")
+    parser.add_argument("--packages", type=int, default=20, help="fake packages")
+    parser.add_argument(
+        "--package-files", type=int, default=20, help="files per fake package"
+    )
+    parser.add_argument("--updates", type=int, default=20, help="update_path calls")
+    parser.add_argument("--searches", type=int, default=200, help="queries per kind")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--single-thread", action="store_true")
+    parser.add_argument(
+        "--sharded", action="store_true", help="write names to shards, then merge"
+    )
+    parser.add_argument("--backend", choices=["sqlite", "memory"], default="sqlite")
+    parser.add_argument("--output", type=Path, help="write the results to this file")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(args, Path(workdir))
+    report = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": {
+            key: value for key, value in vars(args).items() if key != "output"
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        args.output.write_text(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
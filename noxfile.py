@@ -70,3 +70,12 @@ def build(session: nox.Session) -> None:
 
     session.install("build")
     session.run("python", "-m", "build")
+
+
+@nox.session
+def bench(session: nox.Session) -> None:
+    """
+    Run the benchmarks. Pass options after --, e.g. -- --files 1000.
+    """
+    session.install(".")
+    session.run("python", "benchmarks/bench_autoimport.py", *session.posargs)
@@ -1,8 +1,21 @@
 """AutoImport module for rope."""
 from __future__ import annotations
 
-from .defs import NameType, SearchResult, Source
+from .backend import Backend, MemoryBackend, SQLiteBackend
+from .defs import IndexTier, NameType, QueryPlan, SearchResult, Source
+from .snapshot import SnapshotIndex
 from .sqlite import AutoImport
 
 __version__ = "0.1.0"
-__all__ = ["AutoImport", "SearchResult", "Source", "NameType"]
+__all__ = [
+    "AutoImport",
+    "SearchResult",
+    "Source",
+    "NameType",
+    "IndexTier",
+    "QueryPlan",
+    "SnapshotIndex",
+    "Backend",
+    "MemoryBackend",
+    "SQLiteBackend",
+]
@@ -0,0 +1,72 @@
+"""Bloom filter to rule out names which are not in the index."""
+from __future__ import annotations
+
+import math
+from typing import Iterable
+
+
+class BloomFilter:
+    """
+    A probabilistic set of strings.
+
+    Membership tests can return false positives, but never false negatives.
+    Items cannot be removed, so deleted items remain (harmless) false positives.
+    """
+
+    capacity: int
+    count: int
+    _size: int
+    _hash_count: int
+    _bits: bytearray
+
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        self.capacity = max(capacity, 1)
+        self.count = 0
+        self._size = max(
+            int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8
+        )
+        self._hash_count = max(round(self._size / self.capacity * math.log(2)), 1)
+        self._bits = bytearray((self._size + 7) // 8)
+
+    @classmethod
+    def from_items(cls, items: Iterable[str], error_rate: float = 0.01) -> BloomFilter:
+        """Create a filter sized for the given items, with room to grow."""
+        unique_items = set(items)
+        bloom_filter = cls(max(len(unique_items) * 2, 1024), error_rate)
+        for item in unique_items:
+            bloom_filter.add(item)
+        return bloom_filter
+
+    @property
+    def full(self) -> bool:
+        """If the filter holds more items than its error rate was sized for."""
+        return self.count > self.capacity
+
+    def add(self, item: str) -> None:
+        """
+        Add an item to the filter.
+
+        Only counts items which set a new bit, so adding an item again,
+        or one which already tests as present, doesn't fill the filter.
+        """
+        added = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self._bits[position >> 3] & mask:
+                self._bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # Double hashing: the k hashes are h1 + i * h2
+        first = hash(item)
+        second = hash((item, self._size)) | 1
+        for index in range(self._hash_count):
+            yield (first + index * second) % self._size
@@ -0,0 +1,99 @@
+"""Cache of search results for repeated queries."""
+from __future__ import annotations
+
+import string
+from collections import OrderedDict
+from typing import Iterable
+
+from .backend import ResultRow
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def matches(text: str, name: str, exact_match: bool) -> bool:
+    """Check if a search for name matches text, ignoring ASCII case like SQLite."""
+    text = text.translate(_ASCII_LOWER)
+    name = name.translate(_ASCII_LOWER)
+    return text == name if exact_match else text.startswith(name)
+
+
+def filter_results(
+    results: Iterable[ResultRow], name: str, exact_match: bool
+) -> list[ResultRow]:
+    """
+    Filter results to those a search for name would return.
+
+    Modules are matched by their last component, which is the imported name.
+    """
+    return [result for result in results if matches(result[1], name, exact_match)]
+
+
+class SearchCache:
+    """
+    Bounded LRU cache of search results.
+
+    Entries are tagged with the generation they were created in.
+    Bumping the generation invalidates every entry.
+    Prefix searches can be answered by filtering the results for a shorter prefix.
+    """
+
+    maxsize: int
+    generation: int
+    _entries: OrderedDict[tuple[str, bool], tuple[int, tuple[ResultRow, ...]]]
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.generation = 0
+        self._entries = OrderedDict()
+
+    def invalidate(self) -> None:
+        """Invalidate all cached results."""
+        self.generation += 1
+
+    def get(self, name: str, exact_match: bool) -> tuple[ResultRow, ...] | None:
+        """Get the cached results for a search, or None if they are not cached."""
+        # Searches ignore ASCII case, so ones differing only by it are identical
+        name = name.translate(_ASCII_LOWER)
+        results = self._get_entry((name, exact_match))
+        if results is not None:
+            return results
+        # A prefix search matches a superset of any longer search
+        for length in range(len(name), 0, -1):
+            prefix_results = self._get_entry((name[:length], False))
+            if prefix_results is not None:
+                results = tuple(filter_results(prefix_results, name, exact_match))
+                self.put(name, exact_match, results)
+                return results
+        return None
+
+    def put(
+        self,
+        name: str,
+        exact_match: bool,
+        results: Iterable[ResultRow],
+        generation: int | None = None,
+    ) -> None:
+        """
+        Cache the results of a search.
+
+        generation is the one the search started in, if the index could
+        change while it ran. The results are already stale if it has changed.
+        """
+        if generation is None:
+            generation = self.generation
+        name = name.translate(_ASCII_LOWER)
+        self._entries[(name, exact_match)] = (generation, tuple(results))
+        self._entries.move_to_end((name, exact_match))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _get_entry(self, key: tuple[str, bool]) -> tuple[ResultRow, ...] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        generation, results = entry
+        if generation != self.generation:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return results
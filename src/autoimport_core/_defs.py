@@ -2,37 +2,58 @@
 from __future__ import annotations
 
 import pathlib
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
 from enum import Enum
 from typing import NamedTuple
 
 from .defs import NameType, Source
 
+# Slots save memory for the many instances created while indexing,
+# but dataclasses only support them since Python 3.10
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, **_SLOTS)
 class ModuleInfo:
     """Descriptor of information to get names from a module."""
 
     filepath: pathlib.Path | None
     modname: str
+    underlined: bool
     process_imports: bool
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, **_SLOTS)
 class ModuleFile(ModuleInfo):
     """Descriptor of information to get names from a file using ast."""
 
     filepath: pathlib.Path
     modname: str
+    underlined: bool
     process_imports: bool
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, **_SLOTS)
+class ModuleArchive(ModuleInfo):
+    """Descriptor of information to get names from a zip archive member using ast."""
+
+    filepath: pathlib.Path  # The archive
+    modname: str
+    underlined: bool
+    process_imports: bool
+    member: str
+    # Read with the other members, so the archive is only open while listing them
+    source: bytes = field(default=b"", repr=False, compare=False)
+
+
+@dataclass(frozen=True, **_SLOTS)
 class ModuleCompiled(ModuleInfo):
     """Descriptor of information to get names using imports."""
 
-    filepath = None
+    filepath: None
     modname: str
+    underlined: bool
     process_imports: bool
 
 
@@ -43,9 +64,10 @@ class PackageType(Enum):
     STANDARD = 1  # Just a folder
     COMPILED = 2  # .so module
     SINGLE_FILE = 3  # a .py file
+    ARCHIVE = 4  # in a zip archive on sys.path: zipapp, egg or wheel
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class Package:
     """Attributes of a package."""
 
@@ -53,9 +75,9 @@ class Package:
     source: Source
     path: pathlib.Path | None
     type: PackageType
-    modified: float
-    underlined: bool
-    indexed: bool = False
+    modified: float = field(default=0, compare=False)
+    underlined: bool = False
+    indexed: bool = field(default=False, compare=False)
 
 
 class Name(NamedTuple):
@@ -68,7 +90,7 @@ class Name(NamedTuple):
     name_type: NameType
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, **_SLOTS)
 class PartialName:
     """Partial information of a Name."""
 
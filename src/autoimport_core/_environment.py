@@ -0,0 +1,51 @@
+"""Fingerprints of the Python environment whose packages are indexed."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Environment:
+    """
+    The interpreter and sys.path entries, which decide what can be imported.
+
+    The key identifies the environment. Installing packages changes the
+    modification times of the sys.path entries, so they aren't part of it,
+    but tell which entries to look at again.
+    """
+
+    interpreter: str
+    version: str
+    paths: dict[str, float]
+
+    @property
+    def key(self) -> str:
+        text = json.dumps([self.interpreter, self.version, list(self.paths)])
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def changed_paths(self, previous: dict[str, float]) -> list[str]:
+        """Get the paths which were added or modified since previous."""
+        return [
+            path
+            for path, modified in self.paths.items()
+            if previous.get(path) != modified
+        ]
+
+
+def get_environment() -> Environment:
+    """Fingerprint the running interpreter."""
+    paths: dict[str, float] = {}
+    for entry in sys.path:
+        # The working directory is only on sys.path when running scripts from it
+        if not entry:
+            continue
+        path = os.path.abspath(entry)
+        try:
+            paths[path] = os.stat(path).st_mtime
+        except OSError:
+            paths[path] = 0.0
+    return Environment(sys.executable, sys.version, paths)
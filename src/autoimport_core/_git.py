@@ -0,0 +1,86 @@
+"""Find changed files using git, instead of walking the project."""
+from __future__ import annotations
+
+import logging
+import subprocess
+from pathlib import Path
+
+from ._watcher import ChangeBatch
+
+logger = logging.getLogger(__name__)
+
+
+def run_git(root: Path, *args: str) -> str | None:
+    """Run a git command in root. Returns None if it fails."""
+    try:
+        process = subprocess.run(
+            ["git", *args],
+            cwd=root,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as error:
+        logger.debug(f"git {' '.join(args)} failed: {error}")
+        return None
+    return process.stdout.decode()
+
+
+def get_head(root: Path) -> str | None:
+    """Get the commit checked out in root, or None if root isn't in a git repo."""
+    output = run_git(root, "rev-parse", "--verify", "--quiet", "HEAD")
+    return output.strip() if output else None
+
+
+def get_dirty_files(root: Path) -> dict[Path, int]:
+    """
+    Get the python files that differ from HEAD in the working tree.
+
+    Includes modified, deleted and untracked (but not ignored) files.
+    Maps each file to its modification time, or -1 if it was deleted.
+    """
+    output = run_git(root, "ls-files", "-z", "-m", "-o", "--exclude-standard")
+    dirty = {}
+    for name in (output or "").split("\0"):
+        if not name.endswith(".py"):
+            continue
+        path = root / name
+        try:
+            dirty[path] = path.stat().st_mtime_ns
+        except OSError:
+            dirty[path] = -1
+    return dirty
+
+
+def get_changes(root: Path, since: str, head: str) -> ChangeBatch | None:
+    """Get the python files changed between two commits, or None if it fails."""
+    output = run_git(
+        root, "diff", "-z", "--name-status", "-M", "--relative", since, head
+    )
+    if output is None:
+        return None
+    batch = ChangeBatch()
+    fields = iter(output.split("\0"))
+    for status in fields:
+        if not status:
+            continue
+        path = root / next(fields)
+        if status[0] in ("R", "C"):
+            new_path = root / next(fields)
+            if status[0] == "C":
+                path = new_path
+            elif path.suffix == ".py" and new_path.suffix == ".py":
+                batch.move(path, new_path)
+                continue
+            elif path.suffix == ".py":
+                batch.remove(path)
+                continue
+            else:
+                path = new_path
+        if path.suffix != ".py":
+            continue
+        if status[0] == "D":
+            batch.remove(path)
+        else:
+            batch.change(path)
+    return batch
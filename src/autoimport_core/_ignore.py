@@ -0,0 +1,177 @@
+"""
+Decide which project files to index.
+
+Supports include and exclude globs, and .gitignore files.
+Patterns follow the .gitignore syntax.
+"""
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Pattern
+
+
+def translate(pattern: str) -> str:
+    """Translate a .gitignore glob to a regex."""
+    regex = ""
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            regex += "(?:.*/)?"
+            index += 3
+        elif pattern.startswith("/**", index) and index + 3 == len(pattern):
+            regex += "/.*"
+            index += 3
+        elif pattern[index] == "*":
+            regex += "[^/]*"
+            index += 1
+        elif pattern[index] == "?":
+            regex += "[^/]"
+            index += 1
+        elif pattern[index] == "[" and "]" in pattern[index + 2 :]:
+            end = pattern.index("]", index + 2)
+            characters = pattern[index + 1 : end].replace("\\", "\\\\")
+            if characters.startswith("!"):
+                characters = "^" + characters[1:]
+            regex += f"[{characters}]"
+            index = end + 1
+        else:
+            regex += re.escape(pattern[index])
+            index += 1
+    return regex
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A single include or exclude pattern, relative to a base directory."""
+
+    regex: Pattern[str]
+    base: Path
+    negate: bool
+    directory_only: bool
+
+    @classmethod
+    def parse(cls, line: str, base: Path) -> Rule | None:
+        """Parse a line of a .gitignore file. Returns None for comments."""
+        line = line.rstrip("\n").rstrip()
+        if not line or line.startswith("#"):
+            return None
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        directory_only = line.endswith("/")
+        line = line.rstrip("/")
+        # Patterns containing a slash are relative to the base
+        anchored = "/" in line
+        regex = translate(line.lstrip("/"))
+        if not anchored:
+            regex = "(?:.*/)?" + regex
+        return cls(re.compile(regex), base, negate, directory_only)
+
+    def matches(self, path: Path, is_dir: bool) -> bool:
+        """Check if the pattern matches a path."""
+        if self.directory_only and not is_dir:
+            return False
+        try:
+            relative = path.relative_to(self.base).as_posix()
+        except ValueError:
+            return False
+        return self.regex.fullmatch(relative) is not None
+
+
+def parse_rules(lines: Iterable[str], base: Path) -> list[Rule]:
+    """Parse the lines of a .gitignore file."""
+    rules = (Rule.parse(line, base) for line in lines)
+    return [rule for rule in rules if rule is not None]
+
+
+class PathFilter:
+    """
+    Filters the python files of a project.
+
+    A file is indexed if it matches an include pattern (or there are none),
+    and neither it nor any of its parent directories are excluded.
+    Exclude patterns take priority over .gitignore files.
+    """
+
+    root: Path
+    _include: list[Rule]
+    _exclude: list[Rule]
+    _use_gitignore: bool
+    _gitignores: dict[Path, list[Rule]]
+
+    def __init__(
+        self,
+        root: Path,
+        include: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+        use_gitignore: bool = False,
+    ) -> None:
+        self.root = root
+        self._include = parse_rules(include, root)
+        self._exclude = parse_rules(exclude, root)
+        self._use_gitignore = use_gitignore
+        self._gitignores = {}
+
+    def walk(self, directory: Path | None = None) -> Iterator[Path]:
+        """Find the python files to index, without entering excluded directories."""
+        if directory is None:
+            directory = self.root
+        for root, dirs, files in os.walk(directory):
+            root_path = Path(root)
+            dirs[:] = [
+                name for name in dirs if not self._excluded(root_path / name, True)
+            ]
+            for name in files:
+                path = root_path / name
+                if name.endswith(".py") and self._file_included(path):
+                    yield path
+
+    def is_excluded(self, path: Path, is_dir: bool = False) -> bool:
+        """Check if a path or any of its parent directories are excluded."""
+        try:
+            parents = list(path.relative_to(self.root).parents)
+        except ValueError:
+            return False
+        for parent in reversed(parents[:-1]):
+            if self._excluded(self.root / parent, True):
+                return True
+        if is_dir:
+            return self._excluded(path, True)
+        return not self._file_included(path)
+
+    def _file_included(self, path: Path) -> bool:
+        if self._include and not any(
+            rule.matches(path, False) for rule in self._include
+        ):
+            return False
+        return not self._excluded(path, False)
+
+    def _excluded(self, path: Path, is_dir: bool) -> bool:
+        excluded = False
+        for rule in self._get_rules(path.parent):
+            if rule.matches(path, is_dir):
+                excluded = not rule.negate
+        return excluded
+
+    def _get_rules(self, directory: Path) -> Iterator[Rule]:
+        if self._use_gitignore:
+            try:
+                parents = directory.relative_to(self.root).parents
+            except ValueError:
+                parents = ()
+            # Deeper .gitignore files take priority
+            for parent in reversed([directory, *(self.root / p for p in parents)]):
+                yield from self._get_gitignore(parent)
+        yield from self._exclude
+
+    def _get_gitignore(self, directory: Path) -> list[Rule]:
+        if directory not in self._gitignores:
+            try:
+                lines = (directory / ".gitignore").read_text().splitlines()
+            except OSError:
+                lines = []
+            self._gitignores[directory] = parse_rules(lines, directory)
+        return self._gitignores[directory]
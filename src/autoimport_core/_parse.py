@@ -7,13 +7,23 @@ Can extract names from source code of a python file, .so object, or builtin modu
 from __future__ import annotations
 
 import ast
+import builtins
 import inspect
 import logging
 import pathlib
+import warnings
 from importlib import import_module
-from typing import Generator
-
-from ._defs import ModuleCompiled, ModuleFile, ModuleInfo, Name, Package, PartialName
+from typing import Generator, Iterator
+
+from ._defs import (
+    ModuleArchive,
+    ModuleCompiled,
+    ModuleFile,
+    ModuleInfo,
+    Name,
+    Package,
+    PartialName,
+)
 from .defs import NameType, Source
 
 logger = logging.getLogger(__name__)
@@ -37,8 +47,20 @@ def get_names_from_file(
     process_imports: bool = False,
 ) -> Generator[PartialName, None, None]:
     """Get all the names from a given file using ast."""
+    yield from get_names_from_source(
+        module.read_bytes(), package_name, underlined, process_imports
+    )
+
+
+def get_names_from_source(
+    source: bytes,
+    package_name: str = "",
+    underlined: bool = False,
+    process_imports: bool = False,
+) -> Generator[PartialName, None, None]:
+    """Get all the names from source code using ast."""
     try:
-        root_node = ast.parse(module.read_bytes())
+        root_node = ast.parse(source)
     except SyntaxError as error:
         logger.exception(error)
         return
@@ -77,6 +99,58 @@ def get_names_from_file(
                     yield PartialName(real_name, get_type_ast(node))
 
 
+# Names defined in every module
+MODULE_NAMES = frozenset(
+    ("__name__", "__file__", "__doc__", "__spec__", "__loader__", "__package__")
+)
+
+
+def get_bound_names(node: ast.AST) -> Iterator[str]:
+    """Get the names a node binds in its scope."""
+    if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+        yield node.id
+    elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        yield node.name
+    elif isinstance(node, ast.arg):
+        yield node.arg
+    elif isinstance(node, (ast.Import, ast.ImportFrom)):
+        for alias in node.names:
+            yield alias.asname or alias.name.split(".")[0]
+    elif isinstance(node, ast.ExceptHandler) and node.name:
+        yield node.name
+    elif isinstance(node, (ast.Global, ast.Nonlocal)):
+        yield from node.names
+    elif getattr(node, "name", None) and type(node).__name__ in (
+        "MatchAs",
+        "MatchStar",
+    ):
+        yield getattr(node, "name")
+    elif type(node).__name__ == "MatchMapping" and getattr(node, "rest", None):
+        yield getattr(node, "rest")
+
+
+def get_undefined_names(source: str | bytes) -> set[str]:
+    """
+    Get names that are used but never defined or imported in source code.
+
+    Scopes are not tracked, a name bound anywhere in the module counts as defined.
+    This avoids false positives at the cost of missing some undefined names.
+    """
+    try:
+        root_node = ast.parse(source)
+    except SyntaxError as error:
+        logger.exception(error)
+        return set()
+    bound: set[str] = set()
+    loaded: set[str] = set()
+    for node in ast.walk(root_node):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            loaded.add(node.id)
+        else:
+            bound.update(get_bound_names(node))
+    return loaded - bound - set(dir(builtins)) - MODULE_NAMES
+
+
 def get_type_object(imported_object: object) -> NameType:
     """Determine the type of an object."""
     if inspect.isclass(imported_object):
@@ -92,6 +166,16 @@ def get_names(module: ModuleInfo, package: Package) -> list[Name]:
         return list(
             get_names_from_compiled(package.name, package.source, module.underlined)
         )
+    if isinstance(module, ModuleArchive):
+        return [
+            combine(package, module, partial_name)
+            for partial_name in get_names_from_source(
+                module.source,
+                package.name,
+                underlined=module.underlined,
+                process_imports=module.process_imports,
+            )
+        ]
     if isinstance(module, ModuleFile):
         return [
             combine(package, module, partial_name)
@@ -129,7 +213,10 @@ def get_names_from_compiled(
     if source not in (Source.BUILTIN, Source.STANDARD):
         return
     try:
-        module = import_module(str(package))
+        with warnings.catch_warnings():
+            # Deprecated modules warn on import, which is just noise here.
+            warnings.simplefilter("ignore")
+            module = import_module(str(package))
     except ImportError:
         logger.error(f"{package} could not be imported for autoimport analysis")
         return
@@ -146,6 +233,6 @@ def get_names_from_compiled(
                     )
 
 
-def combine(package: Package, module: ModuleFile, name: PartialName) -> Name:
+def combine(package: Package, module: ModuleInfo, name: PartialName) -> Name:
     """Combine information to form a full name."""
     return Name(name.name, module.modname, package.name, package.source, name.name_type)
@@ -0,0 +1,146 @@
+"""
+SQL statements used to search and update the index, and their query plans.
+
+Searches compare names case insensitively (for ASCII, like LIKE does) using
+ranges over indexes declared COLLATE NOCASE, so they never scan the table.
+"""
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Sequence
+
+from .defs import NameType, QueryPlan
+
+# The last component of a module name: rtrim(module, <module without dots>)
+# strips it, leaving the parent package and its trailing dot.
+LAST_COMPONENT = "substr(module, length(rtrim(module, replace(module, '.', ''))) + 1)"
+PARENT = "substr(module, 1, length(rtrim(module, replace(module, '.', ''))) - 1)"
+# Searches return import statement, import name, source, type rows,
+# so the statements are built by SQLite instead of for each row in Python
+NAME_STATEMENT = "'from ' || names.module || ' import ' || names.name"
+MODULE_STATEMENT = (
+    "CASE WHEN instr(module, '.') "
+    f"THEN 'from ' || {PARENT} || ' import ' || {LAST_COMPONENT} "
+    "ELSE 'import ' || module END"
+)
+_MODULE_TYPE = NameType.Module.value
+# Greater than any character which can follow a prefix
+_MAX_CHARACTER = "\U0010ffff"
+
+CREATE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS name_nocase ON names(name COLLATE NOCASE)",
+    f"CREATE INDEX IF NOT EXISTS module_last ON names({LAST_COMPONENT} COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS module ON names(module)",
+    "CREATE INDEX IF NOT EXISTS package ON names(package)",
+)
+# Replaced by name_nocase, which case insensitive searches can use
+DROP_INDEXES = ("DROP INDEX IF EXISTS name",)
+# Dropped while merging large shards, whose names are faster to index at once
+DROP_SEARCH_INDEXES = tuple(
+    f"DROP INDEX IF EXISTS {index}"
+    for index in ("name_nocase", "module_last", "module", "package")
+)
+MERGE_SHARD = (
+    "INSERT INTO names(name, module, package, source, type, env) "
+    "SELECT name, module, package, source, type, env FROM shard.names"
+)
+
+CREATE_SEARCH_NAMES = (
+    "CREATE TEMP TABLE IF NOT EXISTS search_names(name TEXT PRIMARY KEY)"
+)
+# Project names are in environment 0, which every environment shares.
+# The environment is always the last parameter.
+ENVIRONMENT = "env IN (0, ?)"
+SEARCH_NAME = (
+    f"SELECT {NAME_STATEMENT}, name, source, type FROM names "
+    f"WHERE name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE AND {ENVIRONMENT}"
+)
+SEARCH_NAME_EXACT = (
+    f"SELECT {NAME_STATEMENT}, name, source, type FROM names "
+    f"WHERE name = ? COLLATE NOCASE AND {ENVIRONMENT}"
+)
+# Deduplicate first, to build each module's statement once and not once per name
+_SELECT_MODULE_ROWS = (
+    f"SELECT {MODULE_STATEMENT}, {LAST_COMPONENT}, source, {_MODULE_TYPE} "
+    "FROM (SELECT DISTINCT module, source FROM names WHERE {} AND "
+    f"{ENVIRONMENT})"
+)
+SEARCH_MODULE = _SELECT_MODULE_ROWS.format(
+    f"{LAST_COMPONENT} >= ? COLLATE NOCASE AND {LAST_COMPONENT} < ? COLLATE NOCASE"
+)
+SEARCH_MODULE_EXACT = _SELECT_MODULE_ROWS.format(f"{LAST_COMPONENT} = ? COLLATE NOCASE")
+# The case insensitive match uses the index, the case sensitive one filters.
+# Modules are looked up with SEARCH_MODULE_EXACT, one name at a time:
+# joining temp.search_names with the module_last expression index makes
+# SQLite scan the table to build a Bloom filter first.
+SEARCH_MANY = f"""
+    SELECT {NAME_STATEMENT}, name, source FROM names
+    WHERE name COLLATE NOCASE IN (SELECT name FROM temp.search_names)
+        AND name IN (SELECT name FROM temp.search_names) AND {ENVIRONMENT}
+"""
+HAS_MODULE = (
+    f"SELECT 1 FROM names WHERE module = ? AND package = ? AND {ENVIRONMENT} LIMIT 1"
+)
+HAS_NAME = (
+    "SELECT 1 FROM names WHERE module = ? AND package = ? AND name = ? "
+    f"AND {ENVIRONMENT} LIMIT 1"
+)
+DELETE_MODULE = f"DELETE FROM names WHERE module = ? AND {ENVIRONMENT}"
+DELETE_PACKAGE = f"DELETE FROM names WHERE package = ? AND {ENVIRONMENT}"
+# "/" is the character after ".", so this matches every "package_name.*"
+DELETE_SUBMODULES = (
+    f"DELETE FROM names WHERE module > ? AND module < ? AND {ENVIRONMENT}"
+)
+# Modules of different project roots can have the same name
+DELETE_PACKAGE_MODULE = (
+    f"DELETE FROM names WHERE module = ? AND package = ? AND {ENVIRONMENT}"
+)
+DELETE_PACKAGE_SUBMODULES = (
+    "DELETE FROM names WHERE module > ? AND module < ? AND package = ? "
+    f"AND {ENVIRONMENT}"
+)
+
+# Statements to explain, with example parameters
+EXAMPLES: dict[str, tuple[str, Sequence[Any]]] = {
+    "search_name": (SEARCH_NAME, ("abc", "abc" + _MAX_CHARACTER, 1)),
+    "search_name_exact": (SEARCH_NAME_EXACT, ("abc", 1)),
+    "search_module": (SEARCH_MODULE, ("abc", "abc" + _MAX_CHARACTER, 1)),
+    "search_module_exact": (SEARCH_MODULE_EXACT, ("abc", 1)),
+    "search_many": (SEARCH_MANY, (1,)),
+    "has_module": (HAS_MODULE, ("abc.d", "abc", 1)),
+    "has_name": (HAS_NAME, ("abc.d", "abc", "e", 1)),
+    "delete_module": (DELETE_MODULE, ("abc.d", 1)),
+    "delete_package": (DELETE_PACKAGE, ("abc", 1)),
+    "delete_submodules": (DELETE_SUBMODULES, ("abc.", "abc/", 1)),
+    "delete_package_module": (DELETE_PACKAGE_MODULE, ("abc.d", "abc", 1)),
+    "delete_package_submodules": (
+        DELETE_PACKAGE_SUBMODULES,
+        ("abc.", "abc/", "abc", 1),
+    ),
+}
+
+
+def add_column(
+    connection: sqlite3.Connection, table: str, column: str, definition: str
+) -> bool:
+    """Add a column to a table created by an older version. Returns if it was added."""
+    columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+    if column in columns:
+        return False
+    connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+def prefix_range(prefix: str) -> tuple[str, str]:
+    """Get the bounds of the strings starting with prefix."""
+    return prefix, prefix + _MAX_CHARACTER
+
+
+def explain(
+    connection: sqlite3.Connection, name: str, sql: str, parameters: Sequence[Any]
+) -> QueryPlan:
+    """Get the query plan SQLite chooses for a statement."""
+    steps = tuple(
+        row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+    )
+    return QueryPlan(name, " ".join(sql.split()), steps)
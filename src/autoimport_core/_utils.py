@@ -1,17 +1,31 @@
 """Utility functions for the autoimport code."""
 from __future__ import annotations
 
+import logging
 import pathlib
 import sys
+import zipfile
 from collections import OrderedDict
-from typing import Generator
-
-from ._defs import ModuleCompiled, ModuleFile, ModuleInfo, Package, PackageType
+from typing import Generator, Sequence, Union
+
+from ._defs import (
+    ModuleArchive,
+    ModuleCompiled,
+    ModuleFile,
+    ModuleInfo,
+    Package,
+    PackageType,
+)
 from .defs import Source
 
+logger = logging.getLogger(__name__)
+
+# A project root, or every root of a workspace
+Projects = Union[pathlib.Path, Sequence[pathlib.Path], None]
+
 
 def get_package_tuple(
-    package_path: pathlib.Path, project: pathlib.Path | None = None
+    package_path: pathlib.Path, project: Projects = None
 ) -> Package | None:
     """
     Get package name and type from a path.
@@ -38,19 +52,63 @@ def get_package_tuple(
         package_type = PackageType.STANDARD
     package_source: Source = get_package_source(package_path, project, package_name)
     modified_time = package_path.stat().st_mtime
-    return Package(package_name, package_source, package_path, package_type, modified_time)
+    return Package(
+        package_name, package_source, package_path, package_type, modified_time
+    )
+
+
+def is_archive(path: pathlib.Path) -> bool:
+    """Check if a sys.path entry is a zip archive, like a zipapp, egg or wheel."""
+    return path.is_file() and zipfile.is_zipfile(path)
 
 
-def get_package_source(
-    package: pathlib.Path, project: pathlib.Path | None, name: str
-) -> Source:
+def get_archive_packages(
+    archive: pathlib.Path, project: Projects = None
+) -> list[Package]:
+    """
+    Get the top level packages and modules of a zip archive.
+
+    Only the archive's central directory is read.
+    """
+    try:
+        with zipfile.ZipFile(archive) as zip_file:
+            members = zip_file.namelist()
+    except (OSError, zipfile.BadZipFile):
+        return []
+    names: dict[str, None] = {}
+    for member in members:
+        directory, _, file = member.rpartition("/")
+        if not directory and file.endswith(".py"):
+            names[file[:-3]] = None
+        elif file == "__init__.py" and "/" not in directory:
+            names[directory] = None
+    modified_time = archive.stat().st_mtime
+    return [
+        Package(
+            name,
+            get_package_source(archive, project, name),
+            archive,
+            PackageType.ARCHIVE,
+            modified_time,
+        )
+        for name in names
+        if name.isidentifier() and name != "__main__"
+    ]
+
+
+def get_package_source(package: pathlib.Path, project: Projects, name: str) -> Source:
     """Detect the source of a given package. Rudimentary implementation."""
     if name in sys.builtin_module_names:
         return Source.BUILTIN
-    if project is not None and str(project) in str(package):
-        return Source.PROJECT
+    # Checked first, since virtualenvs are often inside the project
     if "site-packages" in package.parts or "__pypackages__" in package.parts:
         return Source.SITE_PACKAGE
+    if project is None:
+        project = []
+    elif isinstance(project, pathlib.Path):
+        project = [project]
+    if any(str(root) in str(package) for root in project):
+        return Source.PROJECT
     if sys.version_info < (3, 10, 0):
         if str(package).startswith(sys.prefix):
             return Source.STANDARD
@@ -82,6 +140,14 @@ def get_modname_from_path(
     return modname
 
 
+def get_module_import(module: str) -> tuple[str, str]:
+    """Get the import statement and import name of a module."""
+    if "." not in module:
+        return f"import {module}", module
+    parent, import_name = module.rsplit(".", 1)
+    return f"from {parent} import {import_name}", import_name
+
+
 def sort_and_deduplicate(results: list[tuple[str, int]]) -> list[str]:
     """Sort and deduplicate a list of name, source entries."""
     results = sorted(results, key=lambda y: y[-1])
@@ -98,7 +164,7 @@ def sort_and_deduplicate_tuple(
     return list(OrderedDict.fromkeys(results_sorted))
 
 
-def should_parse(path: pathlib.Path, underlined: bool) -> bool:
+def should_parse(path: pathlib.PurePath, underlined: bool) -> bool:
     if underlined:
         return True
     for part in path.parts:
@@ -114,6 +180,8 @@ def get_files(
     if package.type in (PackageType.COMPILED, PackageType.BUILTIN):
         if package.source in (Source.STANDARD, Source.BUILTIN):
             yield ModuleCompiled(None, package.name, underlined, True)
+    elif package.type == PackageType.ARCHIVE:
+        yield from get_archive_files(package, underlined)
     elif package.type == PackageType.SINGLE_FILE:
         assert package.path
         assert package.path.suffix == ".py"
@@ -132,3 +200,45 @@ def get_files(
                 yield ModuleFile(
                     file, get_modname_from_path(file, package.path), underlined, False
                 )
+
+
+def get_archive_files(
+    package: Package, underlined: bool = False
+) -> Generator[ModuleInfo, None, None]:
+    """
+    Find all the modules of a package in a zip archive, like get_files.
+
+    Their sources are read at once, so that the archive isn't kept open.
+    """
+    assert package.path
+    modules = []
+    try:
+        with zipfile.ZipFile(package.path) as archive:
+            for member in archive.namelist():
+                directory, _, file = member.rpartition("/")
+                if not file.endswith(".py"):
+                    continue
+                if not directory and file == f"{package.name}.py":
+                    modname, process_imports = package.name, False
+                elif directory != package.name:
+                    continue
+                elif file == "__init__.py":
+                    modname, process_imports = package.name, True
+                elif should_parse(pathlib.PurePosixPath(member), underlined):
+                    modname, process_imports = f"{package.name}.{file[:-3]}", False
+                else:
+                    continue
+                modules.append(
+                    ModuleArchive(
+                        package.path,
+                        modname,
+                        underlined,
+                        process_imports,
+                        member,
+                        archive.read(member),
+                    )
+                )
+    except (OSError, KeyError, zipfile.BadZipFile) as error:
+        logger.error(f"{package.path} could not be read: {error}")
+        return
+    yield from modules
@@ -0,0 +1,360 @@
+"""
+Watch a project for file changes.
+
+Uses inotify on Linux, and falls back to polling elsewhere.
+Events are debounced and coalesced into batches of changes.
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from ._ignore import PathFilter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChangeBatch:
+    """A coalesced set of changes to apply to the index."""
+
+    changed: set[Path] = field(default_factory=set)
+    moved: dict[Path, Path] = field(default_factory=dict)
+    removed: set[Path] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.changed or self.moved or self.removed)
+
+    def change(self, path: Path) -> None:
+        """Record that a file was created or modified."""
+        self.removed.discard(path)
+        self.changed.add(path)
+
+    def remove(self, path: Path) -> None:
+        """Record that a file or directory was deleted."""
+        self.changed.discard(path)
+        for source, destination in list(self.moved.items()):
+            if destination == path:
+                del self.moved[source]
+                path = source
+        self.removed.add(path)
+
+    def move(self, source: Path, destination: Path) -> None:
+        """Record that a file was renamed."""
+        self.removed.discard(destination)
+        if source in self.changed:
+            # The old contents were never indexed, so index the new path instead
+            self.changed.discard(source)
+            self.removed.add(source)
+            self.changed.add(destination)
+            return
+        for original, previous in list(self.moved.items()):
+            if previous == source:
+                self.moved[original] = destination
+                return
+        self.moved[source] = destination
+
+    def without(self, path_filter: PathFilter) -> ChangeBatch:
+        """
+        Drop the changes of the paths path_filter excludes.
+
+        Moving a file out of the excluded paths adds it, and moving it
+        into them removes it.
+        """
+        batch = ChangeBatch(
+            changed={
+                path for path in self.changed if not path_filter.is_excluded(path)
+            },
+            removed={
+                path for path in self.removed if not path_filter.is_excluded(path)
+            },
+        )
+        for source, destination in self.moved.items():
+            if path_filter.is_excluded(destination):
+                if not path_filter.is_excluded(source):
+                    batch.remove(source)
+            elif path_filter.is_excluded(source):
+                batch.change(destination)
+            else:
+                batch.move(source, destination)
+        return batch
+
+
+class Watcher(ABC):
+    """
+    Watches a directory tree for changes to python files.
+
+    Changes are collected on a background thread. Once no event has arrived
+    for delay seconds, they are published as a ChangeBatch.
+    """
+
+    root: Path
+    delay: float
+    path_filter: PathFilter
+    _batch: ChangeBatch
+    _last_event: float
+    _batches: queue.Queue[ChangeBatch]
+    _stopped: threading.Event
+    _thread: threading.Thread | None
+
+    def __init__(
+        self, root: Path, delay: float = 0.2, path_filter: PathFilter | None = None
+    ) -> None:
+        self.root = root
+        self.delay = delay
+        if path_filter is None:
+            path_filter = PathFilter(root, exclude=[".*", "__pycache__"])
+        self.path_filter = path_filter
+        self._batch = ChangeBatch()
+        self._last_event = 0.0
+        self._batches = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Start watching in a background thread."""
+        self._setup()
+        self._thread = threading.Thread(
+            target=self._run, name="autoimport-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching and wait for the background thread."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_batches(self) -> list[ChangeBatch]:
+        """Get all the published batches without blocking."""
+        batches = []
+        while True:
+            try:
+                batches.append(self._batches.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def _run(self) -> None:
+        try:
+            while not self._stopped.is_set():
+                if self._poll(min(self.delay, 0.1)):
+                    self._last_event = time.monotonic()
+                elif self._batch and time.monotonic() - self._last_event > self.delay:
+                    self._batches.put(self._batch)
+                    self._batch = ChangeBatch()
+        finally:
+            self._teardown()
+
+    def _setup(self) -> None:
+        pass
+
+    def _teardown(self) -> None:
+        pass
+
+    @abstractmethod
+    def _poll(self, timeout: float) -> bool:
+        """Wait up to timeout for events and add them to the batch."""
+
+
+class PollingWatcher(Watcher):
+    """Detects changes by periodically comparing modification times."""
+
+    interval: float
+    _snapshot: dict[Path, int]
+    _next_scan: float
+
+    def __init__(
+        self,
+        root: Path,
+        delay: float = 0.2,
+        path_filter: PathFilter | None = None,
+        interval: float = 1.0,
+    ) -> None:
+        super().__init__(root, delay, path_filter)
+        self.interval = interval
+        self._snapshot = {}
+        self._next_scan = 0.0
+
+    def _setup(self) -> None:
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + self.interval
+
+    def _scan(self) -> dict[Path, int]:
+        snapshot = {}
+        for path in self.path_filter.walk():
+            try:
+                snapshot[path] = path.stat().st_mtime_ns
+            except OSError:
+                continue
+        return snapshot
+
+    def _poll(self, timeout: float) -> bool:
+        remaining = self._next_scan - time.monotonic()
+        if remaining > 0:
+            self._stopped.wait(min(remaining, timeout))
+            return False
+        self._next_scan = time.monotonic() + self.interval
+        snapshot = self._scan()
+        found = False
+        for path, modified in snapshot.items():
+            if self._snapshot.get(path) != modified:
+                self._batch.change(path)
+                found = True
+        for path in self._snapshot.keys() - snapshot.keys():
+            self._batch.remove(path)
+            found = True
+        self._snapshot = snapshot
+        return found
+
+
+class InotifyWatcher(Watcher):
+    """Receives change events from the Linux kernel through inotify."""
+
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII")
+
+    _libc: ctypes.CDLL
+    _fd: int
+    _directories: dict[int, Path]
+
+    def __init__(
+        self, root: Path, delay: float = 0.2, path_filter: PathFilter | None = None
+    ) -> None:
+        super().__init__(root, delay, path_filter)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = -1
+        self._directories = {}
+
+    @classmethod
+    def available(cls) -> bool:
+        """Check if inotify can be used on this platform."""
+        if not sys.platform.startswith("linux"):
+            return False
+        library = ctypes.util.find_library("c")
+        return library is not None and hasattr(ctypes.CDLL(library), "inotify_init1")
+
+    def _setup(self) -> None:
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._add_watches(self.root)
+
+    def _teardown(self) -> None:
+        os.close(self._fd)
+        self._fd = -1
+
+    def _add_watches(self, directory: Path) -> None:
+        for root, dirs, _ in os.walk(directory):
+            dirs[:] = [
+                name
+                for name in dirs
+                if not self.path_filter.is_excluded(Path(root, name), True)
+            ]
+            descriptor = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(root), self.WATCH_MASK
+            )
+            if descriptor < 0:
+                logger.warning(
+                    f"Could not watch {root}: {os.strerror(ctypes.get_errno())}"
+                )
+                continue
+            self._directories[descriptor] = Path(root)
+
+    def _poll(self, timeout: float) -> bool:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+        data = b""
+        while True:
+            try:
+                chunk = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            data += chunk
+        self._handle_events(data)
+        return True
+
+    def _handle_events(self, data: bytes) -> None:
+        moved_from: dict[int, tuple[Path, bool]] = {}
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, cookie, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed, rescanning project")
+                for path in self.path_filter.walk():
+                    self._batch.change(path)
+                continue
+            if mask & self.IN_IGNORED:
+                self._directories.pop(descriptor, None)
+                continue
+            directory = self._directories.get(descriptor)
+            if directory is None or not name:
+                continue
+            path = directory / name
+            is_dir = bool(mask & self.IN_ISDIR)
+            if (not is_dir and path.suffix != ".py") or self.path_filter.is_excluded(
+                path, is_dir
+            ):
+                continue
+            if mask & self.IN_MOVED_FROM:
+                moved_from[cookie] = (path, is_dir)
+            elif mask & self.IN_MOVED_TO:
+                source = moved_from.pop(cookie, None)
+                if source is not None and not is_dir:
+                    self._batch.move(source[0], path)
+                else:
+                    if source is not None:
+                        self._batch.remove(source[0])
+                    self._created(path, is_dir)
+            elif mask & self.IN_CREATE:
+                if is_dir:
+                    self._created(path, is_dir)
+            elif mask & self.IN_DELETE:
+                self._batch.remove(path)
+            elif mask & self.IN_CLOSE_WRITE:
+                self._batch.change(path)
+        # Moved out of the watched tree
+        for path, _ in moved_from.values():
+            self._batch.remove(path)
+
+    def _created(self, path: Path, is_dir: bool) -> None:
+        if is_dir:
+            self._add_watches(path)
+            for file in self.path_filter.walk(path):
+                self._batch.change(file)
+        else:
+            self._batch.change(path)
+
+
+def create_watcher(
+    root: Path, delay: float = 0.2, path_filter: PathFilter | None = None
+) -> Watcher:
+    """Create the best available watcher for this platform."""
+    if InotifyWatcher.available():
+        return InotifyWatcher(root, delay, path_filter)
+    return PollingWatcher(root, delay, path_filter)
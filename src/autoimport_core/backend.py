@@ -0,0 +1,533 @@
+"""
+Storage backends for the indexed names.
+
+AutoImport keeps its bookkeeping (indexed packages, metadata) in SQLite,
+and the names themselves in a backend.
+Searches match names, and the last component of modules,
+by prefix or exactly, ignoring ASCII case.
+"""
+from __future__ import annotations
+
+import sqlite3
+import string
+import sys
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Tuple, Union
+
+from . import _queries
+from ._defs import Name
+from ._utils import get_module_import
+from .defs import NameType, QueryPlan, Source
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# name, module, package, source, type
+Row = Tuple[str, str, str, int, int]
+# import statement, import name, source, type
+ResultRow = Tuple[str, str, int, int]
+# import statement, import name, source
+ManyRow = Tuple[str, str, int]
+
+
+class Backend(ABC):
+    """Stores names and searches them."""
+
+    # The id of the environment whose names are used, set by AutoImport.
+    # Backends which don't persist names only ever see one, and can ignore it.
+    environment: int = 0
+    # If the names outlive the process, so that they can be kept with
+    # the bookkeeping of an index file
+    persistent: bool = False
+
+    def setup(self) -> None:
+        """Prepare the storage, if it isn't already."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every name."""
+
+    @abstractmethod
+    def add_names(self, names: Iterable[Name]) -> None:
+        """Add names. Nothing is committed until AutoImport commits."""
+
+    @abstractmethod
+    def delete_module(self, module: str, package: str | None = None) -> None:
+        """Remove the names of a module, only those indexed from package if given."""
+
+    @abstractmethod
+    def delete_package(self, package: str) -> None:
+        """Remove the names of a package."""
+
+    @abstractmethod
+    def delete_submodules(self, module: str, package: str | None = None) -> None:
+        """
+        Remove the names of every module inside module, but not its own.
+
+        Only removes those indexed from package, if given.
+        """
+
+    @abstractmethod
+    def search_names(self, name: str, exact_match: bool) -> Iterator[ResultRow]:
+        """Find the names matching name."""
+
+    @abstractmethod
+    def search_modules(self, name: str, exact_match: bool) -> Iterator[ResultRow]:
+        """Find the distinct modules whose last component matches name."""
+
+    @abstractmethod
+    def iter_rows(self) -> Iterator[Row]:
+        """Iterate over every name."""
+
+    def has_module(self, module: str, package: str, name: str | None = None) -> bool:
+        """Check if module was indexed from package, with name in it if given."""
+        return any(
+            row[1] == module and row[2] == package and name in (None, row[0])
+            for row in self.iter_rows()
+        )
+
+    def search_many(self, names: set[str]) -> Iterator[ManyRow]:
+        """Find the names and modules matching any of names, case sensitively."""
+        for name in names:
+            for rows in (
+                self.search_names(name, True),
+                self.search_modules(name, True),
+            ):
+                for statement, found, source, _ in rows:
+                    if found == name:
+                        yield statement, found, source
+
+    def distinct_names(self) -> Iterator[str]:
+        """Iterate over the names, without repeats."""
+        return iter({row[0] for row in self.iter_rows()})
+
+    def distinct_modules(self) -> Iterator[str]:
+        """Iterate over the modules, without repeats."""
+        return iter({row[1] for row in self.iter_rows()})
+
+    def count_names(self) -> tuple[Counter[int], Counter[str]]:
+        """Count the names from each source and each package."""
+        sources: Counter[int] = Counter()
+        packages: Counter[str] = Counter()
+        for _, _, package, source, _ in self.iter_rows():
+            sources[source] += 1
+            packages[package] += 1
+        return sources, packages
+
+    def explain(self) -> list[QueryPlan]:
+        """Get the query plans of the statements used, if it has any."""
+        return []
+
+
+class SQLiteBackend(Backend):
+    """
+    Stores names in the names table of the AutoImport database.
+
+    Names of several environments are stored side by side,
+    and project names are shared by all of them.
+    """
+
+    connection: sqlite3.Connection
+    persistent = True
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+
+    def setup(self) -> None:
+        self.create_table()
+        # Names indexed before environments were tracked belong to the first one
+        if _queries.add_column(
+            self.connection, "names", "env", "INTEGER NOT NULL DEFAULT 1"
+        ):
+            self.connection.execute(
+                "UPDATE names SET env = 0 WHERE source = ?", (Source.PROJECT.value,)
+            )
+        self.create_indexes()
+
+    def create_table(self) -> None:
+        """Create the names table, without the indexes searches use."""
+        names_table = (
+            "(name TEXT, module TEXT, package TEXT, source INTEGER, type INTEGER,"
+            " env INTEGER NOT NULL)"
+        )
+        self.connection.execute(f"create table if not exists names{names_table}")
+
+    def create_indexes(self) -> None:
+        """Create the indexes searches use, if they don't exist."""
+        for statement in _queries.DROP_INDEXES + _queries.CREATE_INDEXES:
+            self.connection.execute(statement)
+
+    def drop_indexes(self) -> None:
+        """Drop the indexes searches use, until create_indexes."""
+        for statement in _queries.DROP_SEARCH_INDEXES:
+            self.connection.execute(statement)
+
+    def count(self) -> int:
+        """Count the names of every environment."""
+        return int(self.connection.execute("SELECT count(*) FROM names").fetchone()[0])
+
+    @contextmanager
+    def merge_shard(self, path: str) -> Iterator[None]:
+        """
+        Add the names of a shard, a database whose names table was filled
+        by another SQLiteBackend.
+
+        SQLite only attaches databases outside of transactions, so pending
+        changes are committed first, and the names must be committed
+        before the block ends, or they are rolled back.
+        """
+        self.connection.commit()
+        self.connection.execute("ATTACH DATABASE ? AS shard", (path,))
+        try:
+            self.connection.execute(_queries.MERGE_SHARD)
+            yield
+        finally:
+            self.connection.rollback()
+            self.connection.execute("DETACH DATABASE shard")
+
+    def clear(self) -> None:
+        self.connection.execute("drop table names")
+        self.setup()
+
+    def add_names(self, names: Iterable[Name]) -> None:
+        self.connection.executemany(
+            "insert into names values (?,?,?,?,?,?)",
+            (
+                (
+                    name.name,
+                    name.modname,
+                    name.package,
+                    name.source.value,
+                    name.name_type.value,
+                    0 if name.source == Source.PROJECT else self.environment,
+                )
+                for name in names
+            ),
+        )
+
+    def delete_module(self, module: str, package: str | None = None) -> None:
+        if package is None:
+            self.connection.execute(_queries.DELETE_MODULE, (module, self.environment))
+        else:
+            self.connection.execute(
+                _queries.DELETE_PACKAGE_MODULE, (module, package, self.environment)
+            )
+
+    def delete_package(self, package: str) -> None:
+        self.connection.execute(_queries.DELETE_PACKAGE, (package, self.environment))
+
+    def delete_submodules(self, module: str, package: str | None = None) -> None:
+        if package is None:
+            self.connection.execute(
+                _queries.DELETE_SUBMODULES,
+                (module + ".", module + "/", self.environment),
+            )
+        else:
+            self.connection.execute(
+                _queries.DELETE_PACKAGE_SUBMODULES,
+                (module + ".", module + "/", package, self.environment),
+            )
+
+    def search_names(self, name: str, exact_match: bool) -> Iterator[ResultRow]:
+        if exact_match:
+            return self.connection.execute(
+                _queries.SEARCH_NAME_EXACT, (name, self.environment)
+            )
+        return self.connection.execute(
+            _queries.SEARCH_NAME, (*_queries.prefix_range(name), self.environment)
+        )
+
+    def search_modules(self, name: str, exact_match: bool) -> Iterator[ResultRow]:
+        if exact_match:
+            return self.connection.execute(
+                _queries.SEARCH_MODULE_EXACT, (name, self.environment)
+            )
+        return self.connection.execute(
+            _queries.SEARCH_MODULE, (*_queries.prefix_range(name), self.environment)
+        )
+
+    def iter_rows(self) -> Iterator[Row]:
+        return self.connection.execute(
+            "SELECT name, module, package, source, type FROM names "
+            f"WHERE {_queries.ENVIRONMENT}",
+            (self.environment,),
+        )
+
+    def has_module(self, module: str, package: str, name: str | None = None) -> bool:
+        if name is None:
+            row = self.connection.execute(
+                _queries.HAS_MODULE, (module, package, self.environment)
+            ).fetchone()
+        else:
+            row = self.connection.execute(
+                _queries.HAS_NAME, (module, package, name, self.environment)
+            ).fetchone()
+        return row is not None
+
+    def search_many(self, names: set[str]) -> Iterator[ManyRow]:
+        self.connection.execute(_queries.CREATE_SEARCH_NAMES)
+        self.connection.executemany(
+            "INSERT INTO temp.search_names VALUES (?)", ((name,) for name in names)
+        )
+        rows: list[ManyRow] = self.connection.execute(
+            _queries.SEARCH_MANY, (self.environment,)
+        ).fetchall()
+        self.connection.execute("DELETE FROM temp.search_names")
+        for name in names:
+            rows.extend(
+                (statement, found, source)
+                for statement, found, source, _ in self.search_modules(name, True)
+                if found == name
+            )
+        return iter(rows)
+
+    def distinct_names(self) -> Iterator[str]:
+        return (
+            name
+            for name, in self.connection.execute(
+                f"SELECT DISTINCT name FROM names WHERE {_queries.ENVIRONMENT}",
+                (self.environment,),
+            )
+        )
+
+    def distinct_modules(self) -> Iterator[str]:
+        return (
+            module
+            for module, in self.connection.execute(
+                f"SELECT DISTINCT module FROM names WHERE {_queries.ENVIRONMENT}",
+                (self.environment,),
+            )
+        )
+
+    def count_names(self) -> tuple[Counter[int], Counter[str]]:
+        sources: Counter[int] = Counter()
+        for source, count in self.connection.execute(
+            f"SELECT source, count(*) FROM names WHERE {_queries.ENVIRONMENT} "
+            "GROUP BY source",
+            (self.environment,),
+        ):
+            sources[source] = count
+        packages: Counter[str] = Counter()
+        for package, count in self.connection.execute(
+            f"SELECT package, count(*) FROM names WHERE {_queries.ENVIRONMENT} "
+            "GROUP BY package",
+            (self.environment,),
+        ):
+            packages[package] = count
+        return sources, packages
+
+    def explain(self) -> list[QueryPlan]:
+        self.connection.execute(_queries.CREATE_SEARCH_NAMES)
+        return [
+            _queries.explain(self.connection, name, sql, parameters)
+            for name, (sql, parameters) in _queries.EXAMPLES.items()
+        ]
+
+
+class _Record:
+    """A stored name. Deleted records are marked dead, and dropped on compaction."""
+
+    __slots__ = ("name", "module", "package", "source", "type", "alive")
+
+    def __init__(
+        self, name: str, module: str, package: str, source: int, name_type: int
+    ) -> None:
+        self.name = name
+        self.module = module
+        self.package = package
+        self.source = source
+        self.type = name_type
+        self.alive = True
+
+
+class _ModuleRecord:
+    """
+    A distinct module and source, with the number of its names.
+
+    Its search result is built once, when the module is added.
+    """
+
+    __slots__ = ("module", "source", "count", "alive", "row")
+
+    def __init__(self, module: str, source: int) -> None:
+        self.module = module
+        self.source = source
+        self.count = 0
+        self.alive = True
+        statement, import_name = get_module_import(module)
+        self.row: ResultRow = (statement, import_name, source, _MODULE_TYPE)
+
+
+_AnyRecord = Union[_Record, _ModuleRecord]
+_MODULE_TYPE = NameType.Module.value
+
+
+class _SortedIndex:
+    """
+    Records sorted by a key, for prefix and exact lookups.
+
+    Additions are buffered and scanned until there are enough to merge,
+    so that small updates don't reorder the whole array.
+    """
+
+    __slots__ = ("keys", "records", "pending", "dead")
+
+    def __init__(self) -> None:
+        self.keys: list[str] = []
+        self.records: list[_AnyRecord] = []
+        self.pending: list[tuple[str, _AnyRecord]] = []
+        self.dead = 0
+
+    def add(self, key: str, record: _AnyRecord) -> None:
+        self.pending.append((key, record))
+
+    def find(self, key: str, exact_match: bool) -> Iterator[_AnyRecord]:
+        size = len(self.records)
+        if len(self.pending) > max(1024, size // 16) or self.dead > size // 4:
+            self._compact()
+        keys = self.keys
+        index = bisect_left(keys, key)
+        while index < len(keys):
+            found = keys[index]
+            if found != key and (exact_match or not found.startswith(key)):
+                break
+            record = self.records[index]
+            if record.alive:
+                yield record
+            index += 1
+        for found, record in self.pending:
+            if record.alive and (
+                found == key or (not exact_match and found.startswith(key))
+            ):
+                yield record
+
+    def _compact(self) -> None:
+        # Both runs are sorted, which the sort merges in linear time
+        entries = [
+            (key, record)
+            for key, record in zip(self.keys, self.records)
+            if record.alive
+        ]
+        entries.extend(entry for entry in self.pending if entry[1].alive)
+        entries.sort(key=lambda entry: entry[0])
+        self.keys = [key for key, _ in entries]
+        self.records = [record for _, record in entries]
+        self.pending = []
+        self.dead = 0
+
+
+class MemoryBackend(Backend):
+    """
+    Stores names in memory, in arrays sorted by their search keys.
+
+    Module and package strings are interned, so each is stored once.
+    Faster than SQLite for searches, but the names are lost on close.
+    """
+
+    _modules: dict[str, list[_Record]]
+    _module_records: dict[str, dict[int, _ModuleRecord]]
+    _packages: defaultdict[str, set[str]]
+    _names: _SortedIndex
+    _last_components: _SortedIndex
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        self._modules = {}
+        self._module_records = {}
+        self._packages = defaultdict(set)
+        self._names = _SortedIndex()
+        self._last_components = _SortedIndex()
+
+    def add_names(self, names: Iterable[Name]) -> None:
+        for name in names:
+            module = sys.intern(name.modname)
+            package = sys.intern(name.package)
+            record = _Record(
+                name.name, module, package, name.source.value, name.name_type.value
+            )
+            self._modules.setdefault(module, []).append(record)
+            self._packages[package].add(module)
+            self._names.add(name.name.translate(_ASCII_LOWER), record)
+            module_records = self._module_records.setdefault(module, {})
+            module_record = module_records.get(record.source)
+            if module_record is None:
+                module_record = _ModuleRecord(module, record.source)
+                module_records[record.source] = module_record
+                self._last_components.add(
+                    module.rsplit(".", 1)[-1].translate(_ASCII_LOWER), module_record
+                )
+            module_record.count += 1
+
+    def delete_module(self, module: str, package: str | None = None) -> None:
+        self._delete(
+            module, lambda record: package is None or record.package == package
+        )
+
+    def delete_package(self, package: str) -> None:
+        for module in self._packages.pop(package, ()):
+            self._delete(module, lambda record: record.package == package)
+
+    def delete_submodules(self, module: str, package: str | None = None) -> None:
+        prefix = module + "."
+        for submodule in [
+            submodule for submodule in self._modules if submodule.startswith(prefix)
+        ]:
+            self.delete_module(submodule, package)
+
+    def _delete(self, module: str, predicate: Callable[[_Record], bool]) -> None:
+        records = self._modules.get(module, [])
+        kept = []
+        for record in records:
+            if not predicate(record):
+                kept.append(record)
+                continue
+            record.alive = False
+            self._names.dead += 1
+            module_record = self._module_records[module][record.source]
+            module_record.count -= 1
+            if not module_record.count:
+                module_record.alive = False
+                self._last_components.dead += 1
+                del self._module_records[module][record.source]
+        if kept:
+            self._modules[module] = kept
+        else:
+            self._modules.pop(module, None)
+            self._module_records.pop(module, None)
+
+    def search_names(self, name: str, exact_match: bool) -> Iterator[ResultRow]:
+        for record in self._names.find(name.translate(_ASCII_LOWER), exact_match):
+            assert isinstance(record, _Record)
+            yield (
+                f"from {record.module} import {record.name}",
+                record.name,
+                record.source,
+                record.type,
+            )
+
+    def search_modules(self, name: str, exact_match: bool) -> Iterator[ResultRow]:
+        for record in self._last_components.find(
+            name.translate(_ASCII_LOWER), exact_match
+        ):
+            assert isinstance(record, _ModuleRecord)
+            yield record.row
+
+    def iter_rows(self) -> Iterator[Row]:
+        for records in self._modules.values():
+            for record in records:
+                yield record.name, record.module, record.package, record.source, record.type
+
+    def distinct_modules(self) -> Iterator[str]:
+        return iter(list(self._modules))
+
+    def has_module(self, module: str, package: str, name: str | None = None) -> bool:
+        if module not in self._packages.get(package, ()):
+            return False
+        return name is None or any(
+            record.name == name and record.package == package
+            for record in self._modules[module]
+        )
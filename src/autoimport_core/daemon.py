@@ -0,0 +1,426 @@
+"""
+A daemon sharing one index between several editor processes and projects.
+
+The daemon serves the environment it runs in, so run one per interpreter.
+Each project is a root of its index, so the packages and standard library
+are only indexed once. The searches of a project only find its own names
+and those of the packages.
+It listens on a Unix socket, and each line sent is a JSON request:
+
+    {"id": 1, "method": "search", "params": {"project": "/src/app", "name": "Dic"}}
+
+which is answered by a line with its result, or an error message:
+
+    {"id": 1, "result": [["from typing import Dict", "Dict"]]}
+    {"id": 2, "error": "Unknown method: serch"}
+
+The first request for a project adds it to the index, and it stays there,
+across restarts, until it is closed by close_project.
+Requests writing to the index are handled one at a time,
+and searches run while they do, finding the names written so far.
+
+    python -m autoimport_core.daemon --index-dir ~/.cache/autoimport
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from .sqlite import AutoImport
+
+logger = logging.getLogger(__name__)
+
+
+class DaemonError(Exception):
+    """A request failed in the daemon."""
+
+
+def default_socket_path(prefix: str = sys.prefix) -> Path:
+    """Get the socket of the daemon for the environment installed at prefix."""
+    digest = hashlib.sha1(str(Path(prefix).resolve()).encode()).hexdigest()[:12]
+    # Unix socket paths are limited to about a hundred characters
+    return Path(tempfile.gettempdir()) / f"autoimport-{os.getuid()}-{digest}.sock"
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: _Server
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if line.strip():
+                self.wfile.write(self.server.daemon.handle_line(line))
+                self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, daemon: IndexDaemon) -> None:
+        self.daemon = daemon
+        super().__init__(path, _Handler)
+
+
+class IndexDaemon:
+    """
+    Serves searches and updates of projects over a Unix socket.
+
+    The index is stored in index_dir, or kept in memory if it is None.
+    If observe is set, projects are watched for changes,
+    which are applied before each search.
+    """
+
+    socket_path: Path
+    index_dir: Path | None
+    observe: bool
+    _importer: AutoImport | None
+    _base: Path | None
+    _lock: threading.Lock
+    _open_lock: threading.Lock
+    _write_lock: threading.Lock
+    _search_lock: threading.Lock
+    _server: _Server | None
+    _methods: dict[str, Callable[..., Any]]
+
+    def __init__(
+        self,
+        socket_path: Path | str | None = None,
+        index_dir: Path | str | None = None,
+        observe: bool = False,
+    ) -> None:
+        self.socket_path = (
+            Path(socket_path) if socket_path is not None else default_socket_path()
+        )
+        self.index_dir = Path(index_dir) if index_dir is not None else None
+        self.observe = observe
+        self._importer = None
+        self._base = None
+        # Guards _importer
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._search_lock = threading.Lock()
+        self._server = None
+        self._methods = {
+            "ping": self._ping,
+            "search": self._search,
+            "search_many": self._search_many,
+            "generate_cache": self._generate_cache,
+            "update_path": self._update_path,
+            "update_module": self._update_module,
+            "remove": self._remove,
+            "sync": self._sync,
+            "close_project": self.close_project,
+            "shutdown": self.shutdown,
+        }
+
+    def serve_forever(self) -> None:
+        """Listen on the socket until shut down, then close every index."""
+        self._remove_stale_socket()
+        if self.index_dir is not None:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+        # Only the user running the daemon can connect
+        umask = os.umask(0o077)
+        try:
+            self._server = _Server(str(self.socket_path), self)
+        finally:
+            os.umask(umask)
+        logger.info(f"Listening on {self.socket_path}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._server = None
+            self.socket_path.unlink()
+            self.close()
+
+    def shutdown(self) -> None:
+        """Stop serving. Must be called from another thread than serve_forever."""
+        if self._server is not None:
+            # Waits for serve_forever, so it can't run on the request's thread
+            threading.Thread(target=self._server.shutdown).start()
+
+    def close(self) -> None:
+        """Close the index, keeping the names of every project in it."""
+        with self._open_lock, self._lock:
+            importer, self._importer = self._importer, None
+        if importer is not None:
+            with self._write_lock, self._search_lock:
+                importer.close()
+        if self._base is not None:
+            shutil.rmtree(self._base)
+            self._base = None
+
+    def close_project(self, project: str) -> None:
+        """Remove a project and its names, until it is requested again."""
+        path = Path(project).resolve()
+        importer = self._get_index()
+        with self._write_lock:
+            if path in importer.roots:
+                importer.remove_root(path)
+
+    def handle_line(self, line: bytes) -> bytes:
+        """Handle a request line, and get its response line."""
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            method = self._methods.get(request.get("method"))
+            if method is None:
+                raise DaemonError(f"Unknown method: {request.get('method')}")
+            response = {"id": request_id, "result": method(**request.get("params", {}))}
+        except Exception as error:  # Reported to the client, not fatal
+            logger.debug("Request failed", exc_info=True)
+            response = {"id": request_id, "error": f"{type(error).__name__}: {error}"}
+        return json.dumps(response).encode() + b"\n"
+
+    def _get_importer(self, project: str) -> tuple[AutoImport, Path]:
+        """Get the index and the root of project, adding it if it is new."""
+        path = Path(project).resolve()
+        importer = self._get_index()
+        if path not in importer.roots:
+            # add_root writes to the index
+            with self._write_lock:
+                importer.add_root(path)
+        return importer, path
+
+    def _get_index(self) -> AutoImport:
+        with self._lock:
+            importer = self._importer
+        if importer is None:
+            # Opened without the lock, so requests not needing it aren't blocked
+            with self._open_lock:
+                importer = self._importer
+                if importer is None:
+                    importer = self._open()
+                    with self._lock:
+                        self._importer = importer
+        return importer
+
+    def _open(self) -> AutoImport:
+        index = None
+        if self.index_dir is not None:
+            digest = hashlib.sha1(str(Path(sys.prefix).resolve()).encode())
+            index = str(self.index_dir / f"{digest.hexdigest()[:16]}.db")
+        # Projects are roots of the index, so they can be removed. Its project
+        # is an empty directory, which can't be.
+        self._base = Path(tempfile.mkdtemp(prefix="autoimport-"))
+        return AutoImport(self._base, index=index, observe=self.observe)
+
+    def _ping(self) -> str:
+        return "pong"
+
+    def _search(
+        self, project: str, name: str, exact_match: bool = False
+    ) -> list[tuple[str, str]]:
+        importer, root = self._get_importer(project)
+        self._sync_before_search(importer)
+        with self._search_lock:
+            return importer.search(name, exact_match, root)
+
+    def _search_many(
+        self, project: str, names: Iterable[str]
+    ) -> dict[str, list[tuple[str, str]]]:
+        importer, root = self._get_importer(project)
+        self._sync_before_search(importer)
+        with self._search_lock:
+            return importer.search_many(names, root)
+
+    def _sync_before_search(self, importer: AutoImport) -> None:
+        """Apply the changes found by observe, unless the index is being written."""
+        if self.observe and self._write_lock.acquire(blocking=False):
+            try:
+                importer.sync()
+            finally:
+                self._write_lock.release()
+
+    def _generate_cache(
+        self,
+        project: str,
+        package_names: list[str] | None = None,
+        files: list[str] | None = None,
+    ) -> None:
+        importer, _ = self._get_importer(project)
+        with self._write_lock:
+            importer._generate_cache(
+                package_names=package_names,
+                files=[Path(file) for file in files] if files is not None else None,
+            )
+
+    def _update_path(self, project: str, path: str) -> None:
+        importer, _ = self._get_importer(project)
+        with self._write_lock:
+            importer.update_path(Path(path))
+
+    def _update_module(self, project: str, module: str) -> None:
+        importer, _ = self._get_importer(project)
+        with self._write_lock:
+            importer.update_module(module)
+
+    def _remove(self, project: str, path: str) -> None:
+        importer, _ = self._get_importer(project)
+        with self._write_lock:
+            importer.remove(Path(path))
+
+    def _sync(self, project: str) -> None:
+        importer, _ = self._get_importer(project)
+        with self._write_lock:
+            importer.sync()
+
+    def _remove_stale_socket(self) -> None:
+        """Remove the socket left by a daemon which exited without cleaning up."""
+        if not self.socket_path.exists():
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(str(self.socket_path))
+            except ConnectionRefusedError:
+                self.socket_path.unlink()
+                return
+        raise DaemonError(f"A daemon is already listening on {self.socket_path}")
+
+
+class DaemonClient:
+    """
+    Sends the requests of a project to a daemon.
+
+    Mirrors the AutoImport methods, so it can be used in its place.
+    """
+
+    project: Path
+    socket_path: Path
+    _socket: socket.socket
+    _file: Any
+    _next_id: int
+
+    def __init__(
+        self,
+        project: Path | str,
+        socket_path: Path | str | None = None,
+        timeout: float | None = None,
+    ) -> None:
+        self.project = Path(project)
+        self.socket_path = (
+            Path(socket_path) if socket_path is not None else default_socket_path()
+        )
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            self._socket.connect(str(self.socket_path))
+        except OSError:
+            self._socket.close()
+            raise
+        self._file = self._socket.makefile("rwb")
+        self._next_id = 0
+
+    def __enter__(self) -> DaemonClient:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Disconnect from the daemon. The index stays open in it."""
+        self._file.close()
+        self._socket.close()
+
+    def request(self, method: str, **params: Any) -> Any:
+        """Send a request, and wait for its result."""
+        self._next_id += 1
+        request = {"id": self._next_id, "method": method, "params": params}
+        self._file.write(json.dumps(request).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise DaemonError("The daemon closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise DaemonError(response["error"])
+        return response["result"]
+
+    def ping(self) -> bool:
+        """Check that the daemon is responding."""
+        response: str = self.request("ping")
+        return response == "pong"
+
+    def search(self, name: str, exact_match: bool = False) -> list[tuple[str, str]]:
+        """Search both modules and names for an import string."""
+        return [
+            (statement, import_name)
+            for statement, import_name in self.request(
+                "search", project=str(self.project), name=name, exact_match=exact_match
+            )
+        ]
+
+    def search_many(self, names: Iterable[str]) -> dict[str, list[tuple[str, str]]]:
+        """Search for the exact matches of several names in a single request."""
+        results = self.request(
+            "search_many", project=str(self.project), names=list(names)
+        )
+        return {
+            name: [(statement, import_name) for statement, import_name in name_results]
+            for name, name_results in results.items()
+        }
+
+    def generate_cache(
+        self,
+        package_names: list[str] | None = None,
+        files: list[Path] | None = None,
+    ) -> None:
+        """Index packages or files, or the whole project if neither is given."""
+        self.request(
+            "generate_cache",
+            project=str(self.project),
+            package_names=package_names,
+            files=[str(file) for file in files] if files is not None else None,
+        )
+
+    def update_path(self, path: Path) -> None:
+        """Update the names of a project file."""
+        self.request("update_path", project=str(self.project), path=str(path))
+
+    def update_module(self, module: str) -> None:
+        """Update the names of a module."""
+        self.request("update_module", project=str(self.project), module=module)
+
+    def remove(self, location: Path) -> None:
+        """Remove the names of a file or directory."""
+        self.request("remove", project=str(self.project), path=str(location))
+
+    def sync(self) -> None:
+        """Apply the project changes found since the last sync."""
+        self.request("sync", project=str(self.project))
+
+    def shutdown(self) -> None:
+        """Stop the daemon, closing the index."""
+        self.request("shutdown")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--socket", type=Path, help="defaults to one per Python environment"
+    )
+    parser.add_argument(
+        "--index-dir", type=Path, help="store the indexes here instead of in memory"
+    )
+    parser.add_argument(
+        "--observe", action="store_true", help="watch projects for changes"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    IndexDaemon(args.socket, args.index_dir, args.observe).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
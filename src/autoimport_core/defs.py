@@ -24,6 +24,15 @@ class Underlined(Enum):
     ALL = "all"
 
 
+class IndexTier(Enum):
+    """Groups of packages, indexed in this order by a full cache generation."""
+
+    PROJECT = 0
+    DEPENDENCIES = 1  # Dependencies configured in pyproject.toml
+    STANDARD = 2
+    SITE_PACKAGES = 3
+
+
 class NameType(Enum):
     """Describes the type of Name for lsp completions. Taken from python lsp server."""
 
@@ -61,3 +70,22 @@ class SearchResult(NamedTuple):
     name: str
     source: Source
     itemkind: NameType
+
+
+class QueryPlan(NamedTuple):
+    """The plan SQLite chose for a statement, from EXPLAIN QUERY PLAN."""
+
+    name: str
+    sql: str
+    steps: tuple[str, ...]
+
+    @property
+    def full_scans(self) -> list[str]:
+        """Steps which read every row of a table or index."""
+        # Temporary tables and subquery results only hold what the query needs
+        return [
+            step
+            for step in self.steps
+            if step.startswith("SCAN ")
+            and not step.startswith(("SCAN temp.", "SCAN (subquery"))
+        ]
@@ -0,0 +1,140 @@
+"""Performance metrics of indexing and searching, and database statistics."""
+from __future__ import annotations
+
+import heapq
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from .defs import Source
+
+PHASES = ("discovery", "parsing", "ipc", "writes")
+
+
+@dataclass
+class IndexMetrics:
+    """
+    Time spent in each phase of indexing, and how much was indexed.
+
+    Phases:
+    discovery: finding the packages and modules to index
+    parsing: extracting names, summed over all workers
+    ipc: between a worker finishing a module and its names being received
+    writes: inserting names and committing
+    """
+
+    phases: dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    elapsed: float = 0.0
+    modules: int = 0
+    names: int = 0
+    max_slowest: int = 10
+    _slowest: list[tuple[float, str]] = field(default_factory=list)
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        """Add the time spent in the block to a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase] += time.perf_counter() - start
+
+    def add_module(self, modname: str, names: int, parse_time: float) -> None:
+        """Record an indexed module."""
+        self.modules += 1
+        self.names += names
+        self.phases["parsing"] += parse_time
+        entry = (parse_time, modname)
+        if len(self._slowest) < self.max_slowest:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+
+    @property
+    def slowest_modules(self) -> list[tuple[str, float]]:
+        """The modules which took the longest to parse, slowest first."""
+        return [(modname, seconds) for seconds, modname in sorted(self._slowest)[::-1]]
+
+    @property
+    def modules_per_second(self) -> float:
+        return self.modules / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def names_per_second(self) -> float:
+        return self.names / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class SearchMetrics:
+    """
+    Latency histogram of searches.
+
+    Bucket n counts searches which took up to 2**n microseconds.
+    """
+
+    buckets: list[int] = field(default_factory=lambda: [0] * 32)
+    count: int = 0
+    total: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        """Record the latency of a search."""
+        microseconds = max(seconds * 1e6, 1.0)
+        bucket = min(math.ceil(math.log2(microseconds)), len(self.buckets) - 1)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Get an upper bound of a latency percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        target = self.count * percent / 100
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return 2.0**bucket / 1e6
+        return 2.0 ** (len(self.buckets) - 1) / 1e6
+
+
+@dataclass
+class Metrics:
+    """Metrics collected by an AutoImport instance."""
+
+    indexing: IndexMetrics = field(default_factory=IndexMetrics)
+    search: SearchMetrics = field(default_factory=SearchMetrics)
+
+    def reset(self) -> None:
+        self.indexing = IndexMetrics()
+        self.search = SearchMetrics()
+
+
+@dataclass
+class DatabaseStats:
+    """Contents and size of the index database."""
+
+    names: int
+    modules: int
+    packages: int
+    environments: int
+    names_per_source: dict[Source, int]
+    names_per_package: dict[str, int]
+    page_size: int
+    page_count: int
+    free_pages: int
+
+    @property
+    def size(self) -> int:
+        """Size of the database in bytes."""
+        return self.page_size * self.page_count
+
+    @property
+    def free_size(self) -> int:
+        """Bytes in unused pages, which vacuuming returns to the file system."""
+        return self.page_size * self.free_pages
@@ -12,6 +12,29 @@ class Prefs:
     underlined: str = field(
         default="project", description="Can be 'project', 'none', or 'all'"
     )
+    use_git: bool = field(
+        default=False, description="Use git to find the files changed since last sync"
+    )
+    include: list[str] = field(
+        default_factory=list,
+        description="Project files to index, as .gitignore style globs. Defaults to all",
+    )
+    exclude: list[str] = field(
+        default_factory=lambda: [
+            ".*",
+            "__pycache__",
+            "node_modules",
+            "build",
+            "dist",
+            "venv",
+            "site-packages",
+            "*.egg-info",
+        ],
+        description="Project files and directories to skip, as .gitignore style globs",
+    )
+    use_gitignore: bool = field(
+        default=True, description="Skip project files ignored by .gitignore files"
+    )
     dependencies: list[str] | None = field(default=None, init=False)
     _dependencies: list[Requirement] | None = field(
         universal_config=UniversalKey.dependencies, default=None)
@@ -19,14 +42,22 @@ class Prefs:
         universal_config=UniversalKey.optional_dependencies, default=None
     )
 
+    @property
+    def declared_dependencies(self) -> list[str]:
+        """The dependencies from pyproject.toml, without the stdlib default."""
+        if self._dependencies is None:
+            return []
+        dependencies = [requirement.name for requirement in self._dependencies]
+        if self._optional_dependencies is not None:
+            for dependency_group in self._optional_dependencies.values():
+                dependencies.extend(
+                    [requirement.name for requirement in dependency_group]
+                )
+        return dependencies
+
     def __post_init__(self) -> None:
         if self._dependencies is None:
             if sys.version_info >= (3, 10, 0):
                 self.dependencies = sys.stdlib_module_names
         else:
-            self.dependencies = [requirement.name for requirement in self._dependencies]
-            if self._optional_dependencies is not None:
-                for dependency_group in self._optional_dependencies.values():
-                    self.dependencies.extend(
-                        [requirement.name for requirement in dependency_group]
-                    )
+            self.dependencies = self.declared_dependencies
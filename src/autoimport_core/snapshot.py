@@ -0,0 +1,278 @@
+"""
+Compact, memory mapped snapshots of an index.
+
+A snapshot is a single little endian file, laid out as:
+
+header: magic, format version, then the number of strings, names, modules
+    and packages
+string offsets: one u32 per string, plus the end of the last one
+names: fixed width records sorted by name, ignoring ASCII case
+modules: fixed width records sorted by the last component of the module,
+    ignoring ASCII case
+packages: the string of each indexed package
+string data: UTF-8, with each distinct string stored once
+
+Searches binary search the sorted records and only read the strings they
+compare, so opening a snapshot takes the same time whatever its size.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Callable, Generator, Iterable, Iterator, Tuple
+
+from ._defs import Name
+from ._utils import get_module_import, sort_and_deduplicate_tuple
+from .defs import NameType, SearchResult, Source
+
+MAGIC = b"AISNAP\0\0"
+VERSION = 1
+# magic, version, strings, names, modules, packages
+HEADER = struct.Struct("<8sIIIII")
+OFFSET = struct.Struct("<I")
+# name, module, package, source, type
+NAME_RECORD = struct.Struct("<IIIBB2x")
+# module, source
+MODULE_RECORD = struct.Struct("<IB3x")
+PACKAGE_RECORD = struct.Struct("<I")
+
+# name, module, package, source, type
+Row = Tuple[str, str, str, int, int]
+
+
+def _key(text: bytes) -> bytes:
+    # bytes.lower only changes ASCII letters, like SQLite's NOCASE
+    return text.lower()
+
+
+def _last_component(module: bytes) -> bytes:
+    return module.rpartition(b".")[2]
+
+
+def write_snapshot(
+    path: Path | str, rows: Iterable[Row], packages: Iterable[str]
+) -> None:
+    """
+    Write a snapshot of names and indexed packages.
+
+    The snapshot is written to a temporary file and then moved into place,
+    so readers never see a partial snapshot.
+    """
+    rows = list(rows)
+    strings: dict[str, int] = {}
+
+    def intern(text: str) -> int:
+        return strings.setdefault(text, len(strings))
+
+    names = sorted(
+        (_key(name.encode()), name, module, package or "", source, name_type)
+        for name, module, package, source, name_type in rows
+    )
+    modules = sorted(
+        {
+            (_key(_last_component(module.encode())), module, source)
+            for _, module, _, source, _ in rows
+        }
+    )
+    name_records = b"".join(
+        NAME_RECORD.pack(intern(name), intern(module), intern(package), *types)
+        for _, name, module, package, *types in names
+    )
+    module_records = b"".join(
+        MODULE_RECORD.pack(intern(module), source) for _, module, source in modules
+    )
+    package_records = b"".join(
+        PACKAGE_RECORD.pack(intern(package)) for package in packages
+    )
+    # Dictionaries keep insertion order, which is the order of the string ids
+    encoded = [text.encode() for text in strings]
+    offsets = [0]
+    for text in encoded:
+        offsets.append(offsets[-1] + len(text))
+    path = Path(path)
+    temporary = path.with_name(path.name + ".tmp")
+    with temporary.open("wb") as file:
+        file.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                len(encoded),
+                len(names),
+                len(modules),
+                len(package_records) // PACKAGE_RECORD.size,
+            )
+        )
+        file.write(b"".join(OFFSET.pack(offset) for offset in offsets))
+        file.write(name_records)
+        file.write(module_records)
+        file.write(package_records)
+        file.write(b"".join(encoded))
+    os.replace(temporary, path)
+
+
+class SnapshotIndex:
+    """
+    A read only index, memory mapped from a snapshot.
+
+    Supports the same searches as AutoImport, with the same matching rules.
+    """
+
+    path: Path
+    _data: mmap.mmap
+    _names: int
+    _modules: int
+    _packages: int
+    _offsets_start: int
+    _names_start: int
+    _modules_start: int
+    _packages_start: int
+    _strings_start: int
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        with self.path.open("rb") as file:
+            try:
+                self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # Empty file
+                raise ValueError(f"{path} is not an autoimport snapshot") from None
+        if len(self._data) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not an autoimport snapshot")
+        magic, version, strings, names, modules, packages = HEADER.unpack_from(
+            self._data
+        )
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} autoimport snapshot")
+        self._names = names
+        self._modules = modules
+        self._packages = packages
+        self._offsets_start = HEADER.size
+        self._names_start = self._offsets_start + (strings + 1) * OFFSET.size
+        self._modules_start = self._names_start + names * NAME_RECORD.size
+        self._packages_start = self._modules_start + modules * MODULE_RECORD.size
+        self._strings_start = self._packages_start + packages * PACKAGE_RECORD.size
+
+    def close(self) -> None:
+        """Unmap the snapshot."""
+        self._data.close()
+
+    def __len__(self) -> int:
+        return self._names
+
+    @property
+    def packages(self) -> list[str]:
+        """The packages indexed in the snapshot."""
+        return [
+            self._string(
+                PACKAGE_RECORD.unpack_from(
+                    self._data, self._packages_start + index * PACKAGE_RECORD.size
+                )[0]
+            ).decode()
+            for index in range(self._packages)
+        ]
+
+    def search(self, name: str, exact_match: bool = False) -> list[tuple[str, str]]:
+        """
+        Search both modules and names for an import string.
+
+        Returns a sorted list of import statement, modname pairs
+        """
+        results: list[tuple[str, str, int]] = [
+            (statement, import_name, source.value)
+            for statement, import_name, source, _ in self.search_full(name, exact_match)
+        ]
+        return sort_and_deduplicate_tuple(results)
+
+    def search_full(
+        self, name: str, exact_match: bool = False
+    ) -> Generator[SearchResult, None, None]:
+        """
+        Search both modules and names for an import string.
+
+        Returns the import statement, import name, source, and type.
+        Like AutoImport.search_full, each result is returned once.
+        """
+        target = _key(name.encode())
+        # Names defined several times in a module have a record each
+        seen: set[tuple[int, int, int, int]] = set()
+        for index in self._find(self._names, self._name_key, target, exact_match):
+            name_id, module_id, _, source, name_type = self._name_record(index)
+            key = (name_id, module_id, source, name_type)
+            if key in seen:
+                continue
+            seen.add(key)
+            import_name = self._string(name_id).decode()
+            module = self._string(module_id).decode()
+            yield SearchResult(
+                f"from {module} import {import_name}",
+                import_name,
+                Source(source),
+                NameType(name_type),
+            )
+        for index in self._find(self._modules, self._module_key, target, exact_match):
+            module_id, source = self._module_record(index)
+            import_statement, import_name = get_module_import(
+                self._string(module_id).decode()
+            )
+            yield SearchResult(
+                import_statement, import_name, Source(source), NameType.Module
+            )
+
+    def iter_names(self) -> Iterator[Name]:
+        """Iterate over every name in the snapshot."""
+        for index in range(self._names):
+            name_id, module_id, package_id, source, name_type = self._name_record(index)
+            yield Name(
+                self._string(name_id).decode(),
+                sys.intern(self._string(module_id).decode()),
+                sys.intern(self._string(package_id).decode()),
+                Source(source),
+                NameType(name_type),
+            )
+
+    def _find(
+        self,
+        count: int,
+        key: Callable[[int], bytes],
+        target: bytes,
+        exact_match: bool,
+    ) -> Iterator[int]:
+        """Find the records whose key is, or starts with, target."""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if key(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        for index in range(low, count):
+            found = key(index)
+            if found != target and (exact_match or not found.startswith(target)):
+                return
+            yield index
+
+    def _string(self, string_id: int) -> bytes:
+        start, end = struct.unpack_from(
+            "<II", self._data, self._offsets_start + string_id * OFFSET.size
+        )
+        return self._data[self._strings_start + start : self._strings_start + end]
+
+    def _name_record(self, index: int) -> tuple[int, int, int, int, int]:
+        return NAME_RECORD.unpack_from(
+            self._data, self._names_start + index * NAME_RECORD.size
+        )
+
+    def _module_record(self, index: int) -> tuple[int, int]:
+        return MODULE_RECORD.unpack_from(
+            self._data, self._modules_start + index * MODULE_RECORD.size
+        )
+
+    def _name_key(self, index: int) -> bytes:
+        return _key(self._string(self._name_record(index)[0]))
+
+    def _module_key(self, index: int) -> bytes:
+        return _key(_last_component(self._string(self._module_record(index)[0])))
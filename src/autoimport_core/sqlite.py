@@ -1,39 +1,94 @@
 """AutoImport module for rope."""
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
+import logging
+import os
 import sqlite3
+import string
 import sys
-from collections import OrderedDict
-from concurrent.futures import Future, ProcessPoolExecutor, as_completed
-from itertools import chain
+import tempfile
+import time
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, replace
+from functools import partial
+from itertools import chain, islice
 from pathlib import Path
-from typing import Generator, Iterable
+from typing import (
+    AsyncIterator,
+    Callable,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+    TypeVar,
+)
 
 from pytoolconfig import PyToolConfig
 
-from autoimport_core import taskhandle
+from autoimport_core import _queries, taskhandle
+from autoimport_core._bloom import BloomFilter
+from autoimport_core._cache import SearchCache
 from autoimport_core._defs import ModuleFile, ModuleInfo, Name, Package, PackageType
-from autoimport_core._parse import get_names
+from autoimport_core._environment import Environment, get_environment
+from autoimport_core._git import get_changes, get_dirty_files, get_head
+from autoimport_core._ignore import PathFilter
+from autoimport_core._parse import get_names, get_undefined_names
 from autoimport_core._utils import (
+    get_archive_packages,
     get_files,
     get_modname_from_path,
     get_package_tuple,
+    is_archive,
     sort_and_deduplicate_tuple,
 )
-from autoimport_core.defs import NameType, SearchResult, Source, Underlined
+from autoimport_core._watcher import ChangeBatch, Watcher, create_watcher
+from autoimport_core.backend import Backend, ResultRow, SQLiteBackend
+from autoimport_core.defs import (
+    IndexTier,
+    NameType,
+    QueryPlan,
+    SearchResult,
+    Source,
+    Underlined,
+)
+from autoimport_core.metrics import DatabaseStats, Metrics
 from autoimport_core.prefs import Prefs
+from autoimport_core.snapshot import SnapshotIndex, write_snapshot
 
+logger = logging.getLogger(__name__)
+_T = TypeVar("_T")
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+# Run maintain after indexing at least this many modules at once
+_MAINTENANCE_MODULES = 1000
+# Rows sampled per index by the approximate ANALYZE in maintain
+_ANALYSIS_LIMIT = 1000
+# Modules parsed into each shard by sharded builds, so large packages
+# are split between workers
+_SHARD_MODULES = 50
+# Faster than calling the enums, which matters for large result sets
+_SOURCES = {source.value: source for source in Source}
+_NAME_TYPES = {name_type.value: name_type for name_type in NameType}
 
-def _get_future_names(
-    to_index: list[tuple[ModuleInfo, Package]],
-    underlined: bool,
-    job_set: taskhandle.BaseJobSet,
-) -> Generator[Future[list[Name]], None, None]:
-    """Get all names as futures."""
-    with ProcessPoolExecutor() as executor:
-        for module, package in to_index:
-            job_set.started_job(module.modname)
-            yield executor.submit(get_names, module, package)
+
+@dataclass
+class _Root:
+    """A project root, and what finds its files and their changes."""
+
+    path: Path
+    package: Package
+    path_filter: PathFilter
+    watcher: Watcher | None = None
 
 
 def filter_packages(
@@ -53,6 +108,63 @@ def filter_packages(
     return filter(filter_package, packages)
 
 
+_TimedNames = Tuple[List[Name], float, float]
+
+
+def _get_timed_names(module: ModuleInfo, package: Package) -> _TimedNames:
+    """
+    Get all names from a module, timing it.
+
+    Returns the names, the time spent parsing
+    and the wall clock time parsing finished at.
+    """
+    start = time.perf_counter()
+    names = get_names(module, package)
+    return names, time.perf_counter() - start, time.time()
+
+
+# The modname, number of names and parse time of each module,
+# and the wall clock time the shard was written at
+_ShardResult = Tuple[List[Tuple[str, int, float]], float]
+
+
+def _write_shard(
+    path: str, modules: list[ModuleInfo], package: Package, environment: int
+) -> _ShardResult:
+    """Parse modules of a package into a new shard database, for merge_shard."""
+    timings = []
+    connection = sqlite3.connect(path)
+    # The shard is deleted if anything fails, so it doesn't need a journal
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    backend = SQLiteBackend(connection)
+    backend.environment = environment
+    backend.create_table()
+    for module in modules:
+        start = time.perf_counter()
+        names = get_names(module, package)
+        timings.append((module.modname, len(names), time.perf_counter() - start))
+        backend.add_names(names)
+    connection.commit()
+    connection.close()
+    return timings, time.time()
+
+
+def _archive_stamp(package: Package) -> str:
+    """Identify the archive a package was indexed from, and its version."""
+    return f"{package.path}:{package.modified}"
+
+
+def _get_package_names(modules: list[ModuleInfo], package: Package) -> list[Name]:
+    """Get all names from the modules of a package."""
+    return list(chain.from_iterable(get_names(module, package) for module in modules))
+
+
+def _take(iterator: Iterator[_T], count: int) -> list[_T]:
+    """Take up to count items from an iterator."""
+    return list(islice(iterator, count))
+
+
 class AutoImport:
     """A class for finding the module that provides a name.
 
@@ -62,39 +174,98 @@ class AutoImport:
     """
 
     _connection: sqlite3.Connection
+    _backend: Backend
     project: Path
     project_package: Package
     prefs: Prefs
     _packages: dict[str, Package]
-    _underlined: Underlined
+    metrics: Metrics
+    _executor: ThreadPoolExecutor | None
+    _search_cache: SearchCache
+    _name_filter: BloomFilter | None
+    _roots: dict[Path, _Root]
+    _observe: bool
+    _catalogue: dict[str, Package] | None
+    _lazy_executor: ProcessPoolExecutor | None
+    _lazy_futures: dict[str, Future[list[Name]]]
+    underlined: Underlined | bool
+    read_only: bool
+    environment: Environment
+    _environment_id: int
 
     def __init__(
         self,
         project: Path,
-        underlined: Underlined | None = None,
+        underlined: Underlined | bool | None = None,
         index: str | None = None,
+        observe: bool = False,
+        lazy: bool = False,
+        read_only: bool = False,
+        backend: Backend | None = None,
     ):
         """Construct an AutoImport object.
 
         Parameters
         ___________
         project : Path
-            the project to use for project imports
-        observe : bool
-            if true, listen for project changes and update the cache.
+            the project to use for project imports. See add_root for workspaces
+            with several roots.
         underlined : cache underlined names. Overwrite for the preference from TOML
         index : if None, don't persist to disk
+        observe : bool
+            if true, listen for project changes. They are applied by sync.
+        lazy : bool
+            if true, index packages in the background the first time a search
+            matches their name. Until then, searches only return the package.
+            A search without results starts indexing the project dependencies.
+        read_only : bool
+            if true, open an existing index as immutable. Many processes can
+            share it without locking, and methods which write to it raise
+            sqlite3.OperationalError. Cannot be combined with observe or lazy.
+        backend : Backend
+            where to store the names. Defaults to the SQLite index,
+            MemoryBackend keeps them in memory for faster searches.
+            Backends which don't persist the names need an in memory index.
+
+        The index keeps the names of each Python environment it is used with
+        side by side, and uses the names of the running one, see environment.
         """
         self.project = Path(project)
         project_package = get_package_tuple(self.project, self.project)
         assert project_package is not None
         assert project_package.path is not None
         self.project_package = project_package
-        self.underlined = underlined
-        if index is None:
-            index = ":memory:"
-        self.connection = sqlite3.connect(index)
-        self._setup_db()
+        self.read_only = read_only
+        if read_only:
+            if index is None or index == ":memory:":
+                raise ValueError("A read only index must be a file")
+            if observe or lazy:
+                raise ValueError("A read only index cannot be updated")
+            if backend is not None:
+                raise ValueError("A read only index must use the SQLite backend")
+            # immutable skips locking and change detection entirely
+            uri = f"{Path(index).resolve().as_uri()}?mode=ro&immutable=1"
+            self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            if index is None:
+                index = ":memory:"
+            if backend is not None and not backend.persistent and index != ":memory:":
+                # The file would record packages as indexed after their names are lost
+                raise ValueError(
+                    f"{type(backend).__name__} doesn't persist names, "
+                    "so it cannot be used with an index file"
+                )
+            # The async API runs queries on a worker thread
+            self.connection = sqlite3.connect(index, check_same_thread=False)
+        if backend is None:
+            backend = SQLiteBackend(self.connection)
+        self._backend = backend
+        self._executor = None
+        self._search_cache = SearchCache()
+        self.metrics = Metrics()
+        self._name_filter = None
+        if not read_only:
+            self._setup_db()
         self._packages = {
             module: Package(module, Source.BUILTIN, None, PackageType.BUILTIN, 0)
             for module in sys.builtin_module_names
@@ -104,30 +275,319 @@ class AutoImport:
             self.underlined = underlined
         else:
             self.underlined = Underlined(self.prefs.underlined)
+        self._observe = observe
+        self._roots = {}
+        self._start_root(self.project, self.project_package)
+        self.environment = get_environment()
+        self._select_environment()
+        self._restore_roots()
+        self._catalogue = None
+        self._lazy_executor = None
+        self._lazy_futures = {}
+        if lazy:
+            self._catalogue = {}
+            for package in filter_packages(
+                self._get_available_packages(),
+                self._should_cache_underlined(Source.UNKNOWN),
+                self._get_existing(),
+            ):
+                if package.source != Source.PROJECT:
+                    # Earlier sys.path entries shadow later ones
+                    self._catalogue.setdefault(package.name, package)
+
+    @property
+    def roots(self) -> list[Path]:
+        """The project roots, starting with project."""
+        return list(self._roots)
+
+    def add_root(self, path: Path) -> None:
+        """
+        Add another project root, to index and search with the project.
+
+        Each root is a separate package in the index, with its own changes
+        to sync, so modules with the same name in different roots are kept apart.
+        The packages and standard library are shared by every root.
+        Its files are indexed by the next _generate_cache, or update_path.
+        The roots are stored in the index, and added again when it is reopened.
+        """
+        path = Path(path)
+        if path in self._roots:
+            return
+        package = get_package_tuple(path, path)
+        assert package is not None
+        # Roots in different places can have the same directory name
+        digest = hashlib.sha1(str(path.resolve()).encode()).hexdigest()[:8]
+        self._start_root(path, replace(package, name=f"{package.name}@{digest}"))
+        if not self.read_only:
+            self._save_roots()
+            self.connection.commit()
+
+    def remove_root(self, path: Path) -> None:
+        """Remove a project root added by add_root, and its names."""
+        path = Path(path)
+        if path == self.project:
+            raise ValueError("The project root cannot be removed")
+        if path not in self._roots:
+            raise ValueError(f"{path} is not a project root")
+        self._check_writable()
+        root = self._roots[path]
+        self._roots = {key: other for key, other in self._roots.items() if key != path}
+        if root.watcher is not None:
+            root.watcher.stop()
+        self._forget_root(root.package.name)
+        self._save_roots()
+        self.connection.commit()
+
+    def _save_roots(self) -> None:
+        """Store the package name of each root added by add_root."""
+        roots = {
+            str(root.path): root.package.name
+            for root in self._roots.values()
+            if root.path != self.project
+        }
+        self._set_metadata("roots", json.dumps(roots))
+
+    def _restore_roots(self) -> None:
+        """
+        Add the roots stored in the index again.
+
+        The names of the roots which no longer exist are removed.
+        """
+        roots: dict[str, str] = json.loads(self._get_metadata("roots") or "{}")
+        missing = False
+        for path_name, package_name in roots.items():
+            path = Path(path_name)
+            if path == self.project:
+                continue
+            if path.is_dir():
+                package = get_package_tuple(path, path)
+                assert package is not None
+                self._start_root(path, replace(package, name=package_name))
+            elif not self.read_only:
+                self._forget_root(package_name)
+                missing = True
+        if missing:
+            self._save_roots()
+            self.connection.commit()
+
+    def _forget_root(self, package_name: str) -> None:
+        """Delete the names of a root, and what was recorded to sync it."""
+        self._del_package_if_exist(package_name, commit=False)
+        self.connection.execute(
+            "delete from metadata where key in (?, ?)",
+            (f"git_head:{package_name}", f"git_dirty:{package_name}"),
+        )
+
+    def _start_root(self, path: Path, package: Package) -> None:
+        path_filter = PathFilter(
+            path,
+            self.prefs.include,
+            self.prefs.exclude,
+            self.prefs.use_gitignore,
+        )
+        root = _Root(path, package, path_filter)
+        if self._observe:
+            root.watcher = create_watcher(path, path_filter=path_filter)
+            root.watcher.start()
+        # Replaced rather than changed, so roots can be added while iterating them
+        self._roots = {**self._roots, path: root}
+
+    def _get_root(self, path: Path) -> _Root:
+        """Get the innermost root containing path, defaulting to the project."""
+        containing = [
+            root
+            for root in self._roots.values()
+            if root.path == path or root.path in path.parents
+        ]
+        if not containing:
+            return self._roots[self.project]
+        return max(containing, key=lambda root: len(root.path.parts))
+
+    def _root_key(self, root: _Root, key: str) -> str:
+        """Get the metadata key of a root. The project's are unchanged."""
+        if root.path == self.project:
+            return key
+        return f"{key}:{root.package.name}"
+
+    def _is_root_package(self, package_name: str) -> bool:
+        return any(root.package.name == package_name for root in self._roots.values())
 
     def _setup_db(self) -> None:
-        names_table = (
-            "(name TEXT, module TEXT, package TEXT, source INTEGER, type INTEGER)"
+        # Only takes effect before the first table is created, see vacuum
+        self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._backend.setup()
+        self.connection.execute(
+            "create table if not exists packages"
+            "(package TEXT, env INTEGER NOT NULL, modified REAL)"
+        )
+        # Packages indexed before environments were tracked belong to the first one
+        _queries.add_column(
+            self.connection, "packages", "env", "INTEGER NOT NULL DEFAULT 1"
+        )
+        # Without it, packages are indexed again once their sys.path entry changes
+        _queries.add_column(self.connection, "packages", "modified", "REAL")
+        self.connection.execute(
+            "create table if not exists metadata(key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self.connection.execute(
+            "create table if not exists environments(id INTEGER PRIMARY KEY, "
+            "key TEXT UNIQUE, interpreter TEXT, version TEXT, paths TEXT, used REAL)"
         )
-        self.connection.execute(f"create table if not exists names{names_table}")
-        self.connection.execute("CREATE INDEX IF NOT EXISTS name on names(name)")
-        self.connection.execute("CREATE INDEX IF NOT EXISTS module on names(module)")
-        self.connection.execute("CREATE INDEX IF NOT EXISTS package on names(package)")
         self.connection.commit()
 
-    def search(self, name: str, exact_match: bool = False) -> list[tuple[str, str]]:
+    def _select_environment(self) -> None:
+        """
+        Use the names of the running environment, adding it if it is new.
+
+        Packages in the sys.path entries modified since the environment was
+        last used, and packages which are gone, are removed from the index
+        so that the next _generate_cache indexes them again.
+        A read only index uses the most recently used environment
+        if it doesn't have the running one.
+        """
+        if self.read_only and not self._has_table("environments"):
+            self._read_legacy_schema()
+        row = self.connection.execute(
+            "select id, paths from environments where key = ?",
+            (self.environment.key,),
+        ).fetchone()
+        if self.read_only:
+            if row is None:
+                row = self.connection.execute(
+                    "select id, paths from environments order by used desc"
+                ).fetchone()
+            self._environment_id = 0 if row is None else row[0]
+            self._backend.environment = self._environment_id
+            return
+        paths = json.dumps(self.environment.paths)
+        if row is None:
+            cursor = self.connection.execute(
+                "insert into environments(key, interpreter, version, paths, used) "
+                "values (?, ?, ?, ?, ?)",
+                (
+                    self.environment.key,
+                    self.environment.interpreter,
+                    self.environment.version,
+                    paths,
+                    time.time(),
+                ),
+            )
+            assert cursor.lastrowid is not None
+            self._environment_id = cursor.lastrowid
+            self._backend.environment = self._environment_id
+        else:
+            self._environment_id = row[0]
+            self._backend.environment = self._environment_id
+            changed = self.environment.changed_paths(json.loads(row[1]))
+            if changed:
+                self._forget_stale_packages(changed)
+            self.connection.execute(
+                "update environments set paths = ?, used = ? where id = ?",
+                (paths, time.time(), self._environment_id),
+            )
+        self.connection.commit()
+
+    def _has_table(self, name: str) -> bool:
+        return (
+            self.connection.execute(
+                "select 1 from sqlite_master where type = 'table' and name = ?",
+                (name,),
+            ).fetchone()
+            is not None
+        )
+
+    def _read_legacy_schema(self) -> None:
+        """
+        Read an index built before environments were tracked, without migrating it.
+
+        Temporary views shadow its tables, adding the env column queries
+        filter on. Like a migrated index, its names are in the first environment.
+        """
+        self.connection.execute(
+            "create temp view names as "
+            "select name, module, package, source, type, 1 as env from main.names"
+        )
+        self.connection.execute(
+            "create temp view packages as "
+            "select package, 1 as env, null as modified from main.packages"
+        )
+        self.connection.execute(
+            "create temp table environments(id INTEGER PRIMARY KEY, "
+            "key TEXT UNIQUE, interpreter TEXT, version TEXT, paths TEXT, used REAL)"
+        )
+        self.connection.execute(
+            "insert into temp.environments(id, paths) values (1, '{}')"
+        )
+
+    def _forget_stale_packages(self, changed: list[str]) -> None:
+        """
+        Remove the packages which changed, or are no longer on sys.path.
+
+        Only the packages in changed sys.path entries are compared with
+        the modification time they were indexed with.
+        """
+        available: set[str] = set(sys.builtin_module_names)
+        found: dict[str, Package] = {}
+        modified: dict[str, float] = {}
+        for path in self._get_python_paths():
+            in_changed = os.path.abspath(path) in changed
+            for package in self._iter_path_packages(path):
+                # Earlier sys.path entries shadow later ones
+                if package.name not in available:
+                    found[package.name] = package
+                    if in_changed:
+                        modified[package.name] = package.modified
+                available.add(package.name)
+        indexed = dict(
+            self.connection.execute(
+                "select package, modified from packages where env = ?",
+                (self._environment_id,),
+            )
+        )
+        for name in self._get_existing():
+            if self._is_root_package(name):
+                continue
+            if name not in available or (
+                name in modified and modified[name] != indexed.get(name)
+            ):
+                self._forget_package(name)
+                if name in found:
+                    self._unready(self._get_tier(found[name]))
+                elif name in (self.prefs.dependencies or ()):
+                    self._unready(IndexTier.DEPENDENCIES)
+                else:
+                    self._unready(IndexTier.SITE_PACKAGES)
+
+    def _forget_package(self, package_name: str) -> None:
+        """Remove a package, so that the next _generate_cache indexes it again."""
+        self._del_package_if_exist(package_name, commit=False)
+        self.connection.execute(
+            "delete from packages where package = ? and env = ?",
+            (package_name, self._environment_id),
+        )
+
+    def _environment_key(self, key: str) -> str:
+        """Get the metadata key of something which depends on the environment."""
+        return f"{key}:{self._environment_id}"
+
+    def search(
+        self, name: str, exact_match: bool = False, root: Path | None = None
+    ) -> list[tuple[str, str]]:
         """
         Search both modules and names for an import string.
 
-        This is a simple wrapper around search_full with basic sorting based on Source.
+        This is like search_full with basic sorting based on Source,
+        but doesn't build SearchResults.
 
         Returns a sorted list of import statement, modname pairs
         """
+        in_root = self._in_root(root)
         results: list[tuple[str, str, int]] = [
-            (statement, import_name, source.value)
-            for statement, import_name, source, type in self.search_full(
+            (statement, import_name, source)
+            for statement, import_name, source, _ in self._search_rows(
                 name, exact_match
             )
+            if in_root(statement, import_name, source)
         ]
         return sort_and_deduplicate_tuple(results)
 
@@ -136,6 +596,7 @@ class AutoImport:
         name: str,
         exact_match: bool = False,
         ignored_names: set[str] | None = None,
+        root: Path | None = None,
     ) -> Generator[SearchResult, None, None]:
         """
         Search both modules and names for an import string.
@@ -149,87 +610,371 @@ class AutoImport:
             Otherwise, search for any name starting with that name.
         ignored_names : Set[str]
             Will ignore any names in this set
+        root : Path
+            If given, leave out the project names of the other roots,
+            see add_root.
 
         Return
         __________
         Unsorted Generator of SearchResults. Each is guaranteed to be unique.
+        SearchResults are only built for the results which are consumed.
         """
-        results = set(self._search_name(name, exact_match))
-        results = results.union(self._search_module(name, exact_match))
-        if ignored_names is not None:
-            for result in results:
-                if result.name not in ignored_names:
-                    yield result
-        else:
-            yield from results
+        in_root = self._in_root(root)
+        for statement, import_name, source, name_type in self._search_rows(
+            name, exact_match
+        ):
+            if (ignored_names is None or import_name not in ignored_names) and in_root(
+                statement, import_name, source
+            ):
+                yield SearchResult(
+                    statement, import_name, _SOURCES[source], _NAME_TYPES[name_type]
+                )
 
-    def _search_name(
-        self, name: str, exact_match: bool = False
-    ) -> Generator[SearchResult, None, None]:
+    def _in_root(self, root: Path | None) -> Callable[[str, str, int], bool]:
         """
-        Search both names for available imports.
+        Get a check of whether a search result is from root, or not from a project.
 
-        Returns the import statement, import name, source, and type.
+        Every result is if root is None.
         """
-        if not exact_match:
-            name = name + "%"  # Makes the query a starts_with query
-        for import_name, module, source, name_type in self.connection.execute(
-            "SELECT name, module, source, type FROM names WHERE name LIKE (?)", (name,)
-        ):
-            yield (
-                SearchResult(
-                    f"from {module} import {import_name}",
-                    import_name,
-                    Source(source),
-                    NameType(name_type),
-                )
-            )
+        if root is None:
+            return lambda statement, import_name, source: True
+        if Path(root) not in self._roots:
+            raise ValueError(f"{root} is not a project root")
+        package = self._roots[Path(root)].package.name
+        project = Source.PROJECT.value
 
-    def _search_module(
-        self, name: str, exact_match: bool = False
-    ) -> Generator[SearchResult, None, None]:
+        def in_root(statement: str, import_name: str, source: int) -> bool:
+            if source != project:
+                return True
+            if statement.startswith("import "):
+                return self._backend.has_module(statement[len("import ") :], package)
+            # from module import name, which is a name or a submodule
+            module = statement[len("from ") : -len(f" import {import_name}")]
+            return self._backend.has_module(
+                module, package, import_name
+            ) or self._backend.has_module(f"{module}.{import_name}", package)
+
+        return in_root
+
+    def _search_rows(self, name: str, exact_match: bool) -> tuple[ResultRow, ...]:
         """
-        Search both modules for available imports.
+        Search both modules and names for available imports.
 
-        Returns the import statement, import name, source, and type.
+        Returns the import statement, import name, source, and type of each result,
+        with the source and type as their values.
         """
-        if not exact_match:
-            name = name + "%"  # Makes the query a starts_with query
-        for module, source in self.connection.execute(
-            "Select module, source FROM names where module LIKE (?)",
-            ("%." + name,),
-        ):
-            parts = module.split(".")
-            import_name = parts[-1]
-            remaining = parts[0]
-            for part in parts[1:-1]:
-                remaining += "."
-                remaining += part
-            yield (
-                SearchResult(
-                    f"from {remaining} import {import_name}",
-                    import_name,
-                    Source(source),
-                    NameType.Module,
+        start = time.perf_counter()
+        results: tuple[ResultRow, ...] = ()
+        if self._catalogue is not None:
+            results = self._search_catalogue(name, exact_match)
+        if not exact_match or self._might_exist(name):
+            cached_results = self._search_cache.get(name, exact_match)
+            if cached_results is None:
+                generation = self._search_cache.generation
+                result_set = set(self._backend.search_names(name, exact_match))
+                result_set.update(self._backend.search_modules(name, exact_match))
+                cached_results = tuple(result_set)
+                self._search_cache.put(name, exact_match, cached_results, generation)
+            results += cached_results
+        if self._catalogue is not None and not results:
+            self._index_dependencies()
+        self.metrics.search.add(time.perf_counter() - start)
+        return results
+
+    def _index_dependencies(self) -> None:
+        """
+        Index the declared dependencies in the background, after a search missed.
+
+        The name could be in any package, so start with the likeliest ones.
+        Not the whole standard library, which is the default dependencies.
+        """
+        assert self._catalogue is not None
+        for dependency in self.prefs.declared_dependencies:
+            if dependency in self._catalogue:
+                self._index_lazily(self._catalogue[dependency])
+
+    def _search_catalogue(self, name: str, exact_match: bool) -> tuple[ResultRow, ...]:
+        """
+        Search the packages which are not indexed yet, and schedule indexing them.
+
+        Only returns the packages themselves, their names are found once indexed.
+        """
+        assert self._catalogue is not None
+        self._apply_lazy_results()
+        name = name.translate(_ASCII_LOWER)
+        results = []
+        for package in list(self._catalogue.values()):
+            package_name = package.name.translate(_ASCII_LOWER)
+            if package_name == name or (
+                not exact_match and package_name.startswith(name)
+            ):
+                self._index_lazily(package)
+                results.append(
+                    (
+                        f"import {package.name}",
+                        package.name,
+                        package.source.value,
+                        NameType.Module.value,
+                    )
                 )
-            )
-        for module, source in self.connection.execute(
-            "Select module, source from names where module LIKE (?)", (name,)
-        ):
-            if "." in module:
+        return tuple(results)
+
+    def _index_lazily(self, package: Package) -> None:
+        """Index a package in the background, unless it already is."""
+        if package.name in self._lazy_futures:
+            return
+        if self._lazy_executor is None:
+            self._lazy_executor = ProcessPoolExecutor()
+        modules = list(
+            get_files(package, self._should_cache_underlined(package.source))
+        )
+        self._lazy_futures[package.name] = self._lazy_executor.submit(
+            _get_package_names, modules, package
+        )
+
+    def _apply_lazy_results(self) -> None:
+        """
+        Add the packages indexed in the background to the database.
+
+        Packages which could not be indexed are logged, and not searched anymore.
+        """
+        if self._catalogue is None:
+            return
+        for package_name, future in list(self._lazy_futures.items()):
+            if not future.done():
+                continue
+            del self._lazy_futures[package_name]
+            package = self._catalogue.get(package_name)
+            if package is None:
+                continue  # Indexed by _generate_cache in the meantime
+            try:
+                names = future.result()
+            except Exception as error:  # Raised by the worker, not fatal to searches
+                logger.error(f"{package_name} could not be indexed: {error}")
+                del self._catalogue[package_name]
+                if (
+                    isinstance(error, BrokenProcessPool)
+                    and self._lazy_executor is not None
+                ):
+                    # Replaced by the next package to index
+                    self._lazy_executor.shutdown(wait=False)
+                    self._lazy_executor = None
                 continue
-            yield SearchResult(
-                f"import {module}", module, Source(source), NameType.Module
+            self._add_names(names)
+            self._add_packages([package])
+            self.connection.commit()
+
+    def _might_exist(self, name: str) -> bool:
+        """
+        Check if an exact search for name can return results, without querying.
+
+        Wildcard characters in name are treated literally.
+        The filter is only kept if no names were written while building it.
+        """
+        name_filter = self._name_filter
+        if name_filter is None or name_filter.full:
+            generation = self._search_cache.generation
+            name_filter = BloomFilter.from_items(
+                chain(
+                    (
+                        name.translate(_ASCII_LOWER)
+                        for name in self._backend.distinct_names()
+                    ),
+                    (
+                        module.rsplit(".", 1)[-1].translate(_ASCII_LOWER)
+                        for module in self._backend.distinct_modules()
+                    ),
+                )
             )
+            if generation == self._search_cache.generation:
+                self._name_filter = name_filter
+        return name.translate(_ASCII_LOWER) in name_filter
+
+    def search_many(
+        self, names: Iterable[str], root: Path | None = None
+    ) -> dict[str, list[tuple[str, str]]]:
+        """
+        Search for the exact matches of several names in a single query.
+
+        Unlike search, names are compared case sensitively.
+        Like search_full, root leaves out the project names of the other roots.
+        In lazy mode, like search, packages which aren't indexed yet are found
+        by their name, and names without results index the dependencies.
+
+        Returns a mapping of each name to a sorted list of
+        import statement, modname pairs.
+        """
+        results: dict[str, list[tuple[str, str, int]]] = {name: [] for name in names}
+        if not results:
+            return {}
+        if self._catalogue is not None:
+            self._apply_lazy_results()
+            for name in results:
+                package = self._catalogue.get(name)
+                if package is not None:
+                    self._index_lazily(package)
+                    results[name].append((f"import {name}", name, package.source.value))
+        in_root = self._in_root(root)
+        for import_statement, name, source in self._backend.search_many(set(results)):
+            if in_root(import_statement, name, source):
+                results[name].append((import_statement, name, source))
+        if self._catalogue is not None and not all(results.values()):
+            self._index_dependencies()
+        return {
+            name: sort_and_deduplicate_tuple(name_results)
+            for name, name_results in results.items()
+        }
+
+    def find_missing_imports(self, source: str | Path) -> dict[str, list[str]]:
+        """
+        Find names used but not defined in source code and propose imports for them.
+
+        Parameters
+        __________
+        source : str | Path
+            Source code, or the path of a file to read it from
+
+        Return
+        __________
+        A mapping of each undefined name to a sorted list of import statements.
+        Names without any candidates map to an empty list.
+        """
+        if isinstance(source, Path):
+            source = source.read_text()
+        undefined_names = sorted(get_undefined_names(source))
+        return {
+            name: [import_statement for import_statement, _ in results]
+            for name, results in self.search_many(undefined_names).items()
+        }
+
+    async def search_async(
+        self,
+        name: str,
+        exact_match: bool = False,
+        ignored_names: set[str] | None = None,
+        chunk_size: int = 100,
+    ) -> AsyncIterator[SearchResult]:
+        """
+        Search both modules and names for an import string without blocking.
+
+        Asynchronous counterpart of search_full.
+        Results are fetched on a worker thread in chunks of chunk_size.
+        """
+        results = self.search_full(name, exact_match, ignored_names)
+        while True:
+            chunk = await self._run_in_executor(_take, results, chunk_size)
+            if not chunk:
+                return
+            for result in chunk:
+                yield result
 
     def _dump_all(self) -> tuple[list[Name], list[Package]]:
         """Dump the entire database."""
-        name_results = self.connection.execute("select * from names").fetchall()
-        package_results = self.connection.execute("select * from packages").fetchall()
+        # Rows repeat the same modules and packages, so share their strings
+        name_results = [
+            Name(
+                name,
+                sys.intern(module),
+                sys.intern(package),
+                Source(source),
+                NameType(name_type),
+            )
+            for name, module, package, source, name_type in self._backend.iter_rows()
+        ]
+        package_results = self.connection.execute(
+            "select package from packages where env = ?", (self._environment_id,)
+        ).fetchall()
         return name_results, package_results
 
-    def sync(self, task_handle: taskhandle.BaseTaskHandle | None = None):
-        pass
+    def sync(self, task_handle: taskhandle.BaseTaskHandle | None = None) -> None:
+        """
+        Apply the project changes found since the last sync.
+
+        Changes are found by the watcher if observe is enabled.
+        Otherwise, if the use_git preference is set, they are found using git.
+        Packages indexed in the background by lazy mode are added too.
+        """
+        self._check_writable()
+        self._apply_lazy_results()
+        batches: list[ChangeBatch] = []
+        for root in list(self._roots.values()):
+            if root.watcher is not None:
+                batches.extend(root.watcher.get_batches())
+            elif self.prefs.use_git:
+                batch = self._get_git_changes(root)
+                if batch:
+                    batches.append(batch)
+        if not batches:
+            return
+        if task_handle is None:
+            task_handle = taskhandle.NullTaskHandle()
+        job_set = task_handle.create_jobset("Syncing autoimport cache", len(batches))
+        for batch in batches:
+            job_set.started_job(f"{len(batch.changed)} changed files")
+            self._apply_changes(batch)
+            job_set.finished_job()
+
+    def _get_git_changes(self, root: _Root) -> ChangeBatch:
+        """
+        Find the changes of a project root since the last sync using git.
+
+        The HEAD commit and the dirty files are recorded at each sync.
+        The first sync only records them.
+        Like the watcher, skips the paths excluded by the root's path filter.
+        """
+        head = get_head(root.path)
+        if head is None:
+            return ChangeBatch()
+        head_key = self._root_key(root, "git_head")
+        dirty_key = self._root_key(root, "git_dirty")
+        last_head = self._get_metadata(head_key)
+        last_dirty: dict[str, int] = json.loads(self._get_metadata(dirty_key) or "{}")
+        dirty = get_dirty_files(root.path)
+        batch: ChangeBatch | None = ChangeBatch()
+        if last_head is not None and last_head != head:
+            batch = get_changes(root.path, last_head, head)
+        if batch is None:
+            logger.warning(f"Could not compare {last_head} and {head}, skipping sync")
+            batch = ChangeBatch()
+        elif last_head is not None:
+            for path, modified in dirty.items():
+                if last_dirty.get(str(path)) != modified:
+                    batch.change(path)
+            for path_name in last_dirty.keys() - map(str, dirty):
+                # Reverted to the contents of HEAD
+                batch.change(Path(path_name))
+        self._set_metadata(head_key, head)
+        self._set_metadata(
+            dirty_key, json.dumps({str(path): mtime for path, mtime in dirty.items()})
+        )
+        return batch.without(root.path_filter)
+
+    def _get_metadata(self, key: str) -> str | None:
+        row = self.connection.execute(
+            "select value from metadata where key = ?", (key,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _set_metadata(self, key: str, value: str) -> None:
+        self._check_writable()
+        self.connection.execute(
+            "insert or replace into metadata values (?, ?)", (key, value)
+        )
+        self.connection.commit()
+
+    def _apply_changes(self, batch: ChangeBatch) -> None:
+        for path in batch.removed:
+            self.remove(path)
+        for old_path, new_path in batch.moved.items():
+            if new_path.exists():
+                self._moved(old_path, new_path)
+            else:
+                self.remove(old_path)
+        for path in batch.changed:
+            if path.exists():
+                self._changed(path)
+            else:
+                self.remove(path)
 
     def _generate_cache(
         self,
@@ -238,37 +983,365 @@ class AutoImport:
         task_handle: taskhandle.BaseTaskHandle | None = None,
         single_thread: bool = False,
         remove_extras: bool = False,
+        underlined: bool | None = None,
+        sharded: bool = False,
     ) -> None:
         """
         This will work under 3 modes:
         1. packages or files are specified. Autoimport will only index these.
         2. PEP 621 is configured. Only these dependencies are indexed.
         3. Index only standard library modules.
+
+        Without packages or files, the project files are reindexed,
+        skipping the ones excluded by the preferences.
+
+        Packages are indexed in the order of their IndexTier.
+        Each tier is committed as it completes, see get_ready_tiers.
+
+        With sharded, workers write the names to their own databases,
+        which are merged once parsed. This is faster for large builds,
+        where a single writer can't keep up with the workers.
         """
+        self._check_writable()
+        if task_handle is None:
+            task_handle = taskhandle.NullTaskHandle()
+        full = package_names is None and files is None
+        tiers = self._plan_cache(package_names, files, underlined)
+        for tier, to_index in tiers:
+            self._index_tier(tier, to_index, full, task_handle, single_thread, sharded)
+        self._maintain_if_large(tiers)
+
+    def _plan_cache(
+        self,
+        package_names: list[str] | None,
+        files: list[Path] | None,
+        underlined: bool | None,
+    ) -> list[tuple[IndexTier, list[tuple[ModuleInfo, Package]]]]:
+        """Find the modules to index for _generate_cache, grouped by tier."""
+        if package_names is None and files is None:
+            # Each tier is ready again once this run has indexed it
+            self._set_ready_tiers(set())
+        start = time.perf_counter()
+        with self.metrics.indexing.measure("discovery"):
+            tiers = self._find_modules(package_names, files, underlined)
+        self.metrics.indexing.elapsed += time.perf_counter() - start
+        return tiers
+
+    def _find_modules(
+        self,
+        package_names: list[str] | None,
+        files: list[Path] | None,
+        underlined: bool | None,
+    ) -> list[tuple[IndexTier, list[tuple[ModuleInfo, Package]]]]:
+        package_underlined = (
+            self._should_cache_underlined(Source.UNKNOWN)
+            if underlined is None
+            else underlined
+        )
         packages: list[Package] = []
         existing = self._get_existing()
-        to_index: list[tuple[ModuleInfo, Package]] = []
+        tiers: dict[IndexTier, list[tuple[ModuleInfo, Package]]] = {
+            tier: [] for tier in IndexTier
+        }
         if files is not None:
             assert package_names is None  # Cannot have both package_names and files.
-            for file in files:
-                to_index.append(
-                    (self._path_to_module(file, underlined), self.project_package)
-                )
         else:
             if package_names is None:
-                packages = self._get_available_packages()
+                # The project is indexed by walking it instead
+                packages = [
+                    package
+                    for package in self._get_available_packages()
+                    if package.source != Source.PROJECT
+                ]
+                files = []
+                for root in self._roots.values():
+                    # Roots can be nested, and each file belongs to the innermost
+                    files.extend(
+                        file
+                        for file in root.path_filter.walk()
+                        if self._get_root(file) is root
+                    )
+                    self._del_package_if_exist(root.package.name)
             else:
                 for modname in package_names:
                     package = self._find_package_path(modname)
                     if package is None:
                         continue
                     packages.append(package)
-            packages = list(filter_packages(packages, underlined, existing))
+            self._refresh_archives(packages, existing)
+            packages = list(filter_packages(packages, package_underlined, existing))
             for package in packages:
-                for module in get_files(package, underlined):
-                    to_index.append((module, package))
-            self._add_packages(packages)
-        self._index(to_index, underlined, task_handle, single_thread)
+                for module in get_files(
+                    package,
+                    package_underlined or self._should_cache_underlined(package.source),
+                ):
+                    tiers[self._get_tier(package)].append((module, package))
+        for file in files or []:
+            tiers[IndexTier.PROJECT].append(
+                (self._path_to_module(file, underlined), self._get_root(file).package)
+            )
+        return list(tiers.items())
+
+    def _get_tier(self, package: Package) -> IndexTier:
+        if self._is_root_package(package.name):
+            return IndexTier.PROJECT
+        if package.source in (Source.BUILTIN, Source.STANDARD):
+            return IndexTier.STANDARD
+        if package.name in (self.prefs.dependencies or ()):
+            return IndexTier.DEPENDENCIES
+        return IndexTier.SITE_PACKAGES
+
+    def _index_tier(
+        self,
+        tier: IndexTier,
+        to_index: list[tuple[ModuleInfo, Package]],
+        full: bool,
+        task_handle: taskhandle.BaseTaskHandle,
+        single_thread: bool,
+        sharded: bool = False,
+    ) -> None:
+        """Index a tier. If this is a full index, record that the tier is ready."""
+        if task_handle.is_stopped():
+            return
+        self._index(to_index, False, task_handle, single_thread, sharded)
+        if full and not task_handle.is_stopped():
+            self._set_ready_tiers(self.get_ready_tiers() | {tier})
+
+    def _unready(self, tier: IndexTier) -> None:
+        """Record that some packages of a tier have to be indexed again."""
+        self._set_ready_tiers(self.get_ready_tiers() - {tier})
+
+    def _set_ready_tiers(self, tiers: set[IndexTier]) -> None:
+        self._set_metadata(
+            self._environment_key("ready_tiers"),
+            json.dumps(sorted(tier.name for tier in tiers)),
+        )
+
+    def get_ready_tiers(self) -> set[IndexTier]:
+        """
+        Get the tiers which have been fully indexed.
+
+        Tiers are only recorded by full cache generations, in IndexTier order,
+        so searches return results for the earlier tiers while the rest is indexed.
+        A full cache generation starts with none, and a tier is no longer
+        ready once its packages are removed to be indexed again.
+        """
+        return {
+            IndexTier[name]
+            for name in json.loads(
+                self._get_metadata(self._environment_key("ready_tiers")) or "[]"
+            )
+        }
+
+    def explain_queries(self) -> list[QueryPlan]:
+        """
+        Get the query plans of the statements used to search and update the index.
+
+        Logs a warning for each statement which scans a whole table or index,
+        since searches are only fast while SQLite uses the indexes.
+        Backends which don't use SQL have no query plans.
+        """
+        plans = self._backend.explain()
+        for plan in plans:
+            for step in plan.full_scans:
+                logger.warning(f"{plan.name} does a full scan: {step}")
+        return plans
+
+    def get_stats(self) -> DatabaseStats:
+        """Count the indexed names and measure the size of the database."""
+        sources, names_per_package = self._backend.count_names()
+        names_per_source = {Source(source): count for source, count in sources.items()}
+        modules = sum(1 for _ in self._backend.distinct_modules())
+        (packages,) = self.connection.execute(
+            "SELECT count(*) FROM packages WHERE env = ?", (self._environment_id,)
+        ).fetchone()
+        (environments,) = self.connection.execute(
+            "SELECT count(*) FROM environments"
+        ).fetchone()
+        return DatabaseStats(
+            names=sum(names_per_source.values()),
+            modules=modules,
+            packages=packages,
+            environments=environments,
+            names_per_source=names_per_source,
+            names_per_package=dict(names_per_package),
+            page_size=self._get_pragma("page_size"),
+            page_count=self._get_pragma("page_count"),
+            free_pages=self._get_pragma("freelist_count"),
+        )
+
+    def export_snapshot(self, path: Path | str) -> None:
+        """
+        Write the index to a snapshot, which SnapshotIndex opens without loading it.
+
+        See snapshot.py for the format.
+        """
+        self.connection.commit()
+        write_snapshot(
+            path,
+            self._backend.iter_rows(),
+            chain(
+                *self.connection.execute(
+                    "SELECT package FROM packages WHERE env = ?",
+                    (self._environment_id,),
+                )
+            ),
+        )
+
+    def import_snapshot(self, path: Path | str) -> None:
+        """Add the contents of a snapshot, replacing the packages it contains."""
+        self._check_writable()
+        snapshot = SnapshotIndex(path)
+        try:
+            names = list(snapshot.iter_names())
+            packages = snapshot.packages
+        finally:
+            snapshot.close()
+        for package in {name.package for name in names} | set(packages):
+            self._del_package_if_exist(package, commit=False)
+        self.connection.executemany(
+            "DELETE FROM packages WHERE package = ? AND env = ?",
+            ((package, self._environment_id) for package in packages),
+        )
+        self._add_names(names)
+        self.connection.executemany(
+            "INSERT INTO packages(package, env) VALUES (?, ?)",
+            ((package, self._environment_id) for package in packages),
+        )
+        self.connection.commit()
+
+    def optimize(self, analyze: bool = False) -> None:
+        """
+        Update the statistics SQLite uses to plan queries.
+
+        By default, runs PRAGMA optimize, which only analyzes tables
+        whose statistics are likely out of date.
+        With analyze, every table is analyzed exactly, which reads the whole index.
+        """
+        self._check_writable()
+        self.connection.commit()
+        self.connection.execute("ANALYZE" if analyze else "PRAGMA optimize")
+        self.connection.commit()
+
+    def vacuum(self, full: bool = False) -> None:
+        """
+        Return unused pages to the file system.
+
+        Databases created by this version use incremental vacuuming,
+        which only truncates the free pages at the end of the file.
+        A full vacuum rebuilds the whole database, defragmenting it,
+        and converts older databases to incremental vacuuming.
+        """
+        self._check_writable()
+        self.connection.commit()
+        if full or self._get_pragma("auto_vacuum") != 2:
+            self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.connection.execute("VACUUM")
+        else:
+            # Each step frees a page, and executescript runs it to completion
+            self.connection.executescript("PRAGMA incremental_vacuum")
+
+    def check_integrity(self, quick: bool = True) -> list[str]:
+        """
+        Check the database for corruption. Returns the problems found.
+
+        The quick check skips verifying that indexes match their tables.
+        """
+        pragma = "quick_check" if quick else "integrity_check"
+        problems = [
+            row[0] for row in self.connection.execute(f"PRAGMA {pragma}").fetchall()
+        ]
+        return [] if problems == ["ok"] else problems
+
+    def maintain(self) -> None:
+        """
+        Run lightweight maintenance.
+
+        Refreshes the query planner statistics from a sample of each index,
+        and frees unused pages if the database uses incremental vacuuming.
+        Runs automatically after large reindexes.
+        """
+        self._check_writable()
+        self.connection.commit()
+        self.connection.execute(f"PRAGMA analysis_limit = {_ANALYSIS_LIMIT}")
+        self.connection.execute("ANALYZE")
+        self.connection.execute("PRAGMA analysis_limit = 0")
+        self.connection.commit()
+        if self._get_pragma("auto_vacuum") == 2:
+            self.vacuum()
+
+    def _maintain_if_large(
+        self, tiers: list[tuple[IndexTier, list[tuple[ModuleInfo, Package]]]]
+    ) -> None:
+        if sum(len(to_index) for _, to_index in tiers) >= _MAINTENANCE_MODULES:
+            self.maintain()
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            # The same error SQLite raises, before any work is done
+            raise sqlite3.OperationalError("attempt to write a readonly database")
+
+    def _get_pragma(self, name: str) -> int:
+        return int(self.connection.execute(f"PRAGMA {name}").fetchone()[0])
+
+    async def generate_cache_async(
+        self,
+        package_names: list[str] | None = None,
+        files: list[Path] | None = None,
+        task_handle: taskhandle.BaseTaskHandle | None = None,
+        single_thread: bool = False,
+        underlined: bool | None = None,
+        sharded: bool = False,
+    ) -> None:
+        """
+        Generate the cache without blocking the event loop.
+
+        Asynchronous counterpart of _generate_cache.
+        Each tier is a separate job, so searches can run between them.
+        If cancelled, task_handle is stopped and CancelledError is raised.
+        """
+        self._check_writable()
+        if task_handle is None:
+            task_handle = taskhandle.TaskHandle("Generating autoimport cache")
+        full = package_names is None and files is None
+        try:
+            tiers = await self._run_in_executor(
+                self._plan_cache, package_names, files, underlined
+            )
+            for tier, to_index in tiers:
+                await self._run_in_executor(
+                    self._index_tier,
+                    tier,
+                    to_index,
+                    full,
+                    task_handle,
+                    single_thread,
+                    sharded,
+                )
+            await self._run_in_executor(self._maintain_if_large, tiers)
+        except asyncio.CancelledError:
+            task_handle.stop()
+            raise
+
+    async def update_paths_async(
+        self, paths: Iterable[Path], underlined: bool | None = None
+    ) -> None:
+        """
+        Update the cache for several paths without blocking the event loop.
+
+        Each path is a separate job, so cancellation takes effect between paths.
+        """
+        for path in paths:
+            await self._run_in_executor(self.update_path, path, underlined)
+
+    async def _run_in_executor(self, func: Callable[..., _T], *args: object) -> _T:
+        """Run a function on the database thread."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="autoimport"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
 
     def _to_index(self) -> list[Package]:
         return list(filter((lambda package: package.indexed, self._packages)))
@@ -279,7 +1352,15 @@ class AutoImport:
         underlined: bool,
         task_handle: taskhandle.BaseTaskHandle | None,
         single_thread: bool,
+        sharded: bool = False,
     ) -> None:
+        """
+        Index modules, committing each package once all its modules are parsed.
+
+        Stops between modules if task_handle is stopped.
+        Only completed packages are recorded in the packages table,
+        so the next _generate_cache resumes with the remaining ones.
+        """
         if len(to_index) == 0:
             return
         if task_handle is None:
@@ -287,24 +1368,176 @@ class AutoImport:
         job_set = task_handle.create_jobset(
             "Generating autoimport cache", len(to_index)
         )
+        metrics = self.metrics.indexing
+        start = time.perf_counter()
+        if sharded and not single_thread and isinstance(self._backend, SQLiteBackend):
+            self._index_sharded(to_index, task_handle, job_set)
+            metrics.elapsed += time.perf_counter() - start
+            return
+        remaining = Counter(package.name for _, package in to_index)
+        package_names: dict[str, list[Name]] = defaultdict(list)
+
+        def finish_module(
+            module: ModuleInfo, package: Package, result: _TimedNames
+        ) -> None:
+            names, parse_time, _ = result
+            metrics.add_module(module.modname, len(names), parse_time)
+            package_names[package.name].extend(names)
+            remaining[package.name] -= 1
+            if remaining[package.name] == 0:
+                with metrics.measure("writes"):
+                    self._add_names(package_names.pop(package.name))
+                    if not self._is_root_package(package.name):
+                        self._add_packages([package])
+                    self.connection.commit()
+            job_set.finished_job()
+
         if single_thread:
             for module, package in to_index:
+                if task_handle.is_stopped():
+                    break
                 job_set.started_job(module.modname)
-                for name in get_names(module, package):
-                    self._add_name(name)
-                    job_set.finished_job()
+                finish_module(module, package, _get_timed_names(module, package))
         else:
-            for future_name in as_completed(
-                _get_future_names(to_index, underlined, job_set)
-            ):
-                self._add_names(future_name.result())
-                job_set.finished_job()
+            with ProcessPoolExecutor() as executor:
+                futures: dict[Future[_TimedNames], tuple[ModuleInfo, Package]] = {}
+                for module, package in to_index:
+                    job_set.started_job(module.modname)
+                    future = executor.submit(_get_timed_names, module, package)
+                    futures[future] = (module, package)
+                for future in as_completed(futures):
+                    if task_handle.is_stopped():
+                        # Leaving the executor waits only for the running jobs
+                        for pending in futures:
+                            pending.cancel()
+                        break
+                    result = future.result()
+                    metrics.phases["ipc"] += max(time.time() - result[2], 0)
+                    finish_module(*futures[future], result)
+        with metrics.measure("writes"):
+            self.connection.commit()
+        metrics.elapsed += time.perf_counter() - start
 
-        self.connection.commit()
+    def _index_sharded(
+        self,
+        to_index: list[tuple[ModuleInfo, Package]],
+        task_handle: taskhandle.BaseTaskHandle,
+        job_set: taskhandle.BaseJobSet,
+    ) -> None:
+        """
+        Index modules in worker processes, each writing to its own shard.
+
+        Each job parses up to _SHARD_MODULES modules of a package.
+        Once the workers are done, or task_handle is stopped, the shards of
+        the packages whose jobs all finished are merged, see _merge_shards.
+        The other packages aren't recorded, so they are parsed again when resumed.
+        """
+        metrics = self.metrics.indexing
+        modules: dict[str, list[ModuleInfo]] = defaultdict(list)
+        packages: dict[str, Package] = {}
+        for module, package in to_index:
+            modules[package.name].append(module)
+            packages[package.name] = package
+        jobs = [
+            (package_modules[start : start + _SHARD_MODULES], packages[name])
+            for name, package_modules in modules.items()
+            for start in range(0, len(package_modules), _SHARD_MODULES)
+        ]
+        shards: list[tuple[str, Package, int]] = []
+        with tempfile.TemporaryDirectory(prefix="autoimport-") as directory:
+            with ProcessPoolExecutor() as executor:
+                futures: dict[Future[_ShardResult], tuple[str, Package]] = {}
+                for number, (job_modules, package) in enumerate(jobs):
+                    for module in job_modules:
+                        job_set.started_job(module.modname)
+                    shard = os.path.join(directory, f"{number}.db")
+                    future = executor.submit(
+                        _write_shard,
+                        shard,
+                        job_modules,
+                        package,
+                        self._backend.environment,
+                    )
+                    futures[future] = (shard, package)
+                for future in as_completed(futures):
+                    if task_handle.is_stopped():
+                        # Leaving the executor waits only for the running jobs
+                        for pending in futures:
+                            pending.cancel()
+                        break
+                    timings, finished = future.result()
+                    metrics.phases["ipc"] += max(time.time() - finished, 0)
+                    for modname, names, parse_time in timings:
+                        metrics.add_module(modname, names, parse_time)
+                        job_set.finished_job()
+                    shard, package = futures[future]
+                    shards.append(
+                        (shard, package, sum(names for _, names, _ in timings))
+                    )
+            remaining = Counter(package.name for _, package in jobs)
+            remaining.subtract(package.name for _, package, _ in shards)
+            complete = [shard for shard in shards if remaining[shard[1].name] == 0]
+            with metrics.measure("writes"):
+                self._merge_shards(
+                    [(shard, package) for shard, package, _ in complete],
+                    Counter(package.name for _, package, _ in complete),
+                    sum(names for _, _, names in complete),
+                )
+
+    def _merge_shards(
+        self,
+        shards: list[tuple[str, Package]],
+        remaining: Counter[str],
+        shard_names: int,
+    ) -> None:
+        """
+        Add the names of shards, recording each package once all its shards are.
+
+        shards must hold all the names of their packages.
+        remaining is the number of shards of each package, and shard_names
+        the number of names in the shards. If the shards hold more names
+        than the index, its indexes are dropped while merging and built once
+        at the end, which is faster than updating them for each row.
+        """
+        assert isinstance(self._backend, SQLiteBackend)
+        backend = self._backend
+        rebuild = shard_names > backend.count()
+        if rebuild:
+            backend.drop_indexes()
+        try:
+            for shard, package in shards:
+                with backend.merge_shard(shard):
+                    remaining[package.name] -= 1
+                    if remaining[package.name] == 0 and not self._is_root_package(
+                        package.name
+                    ):
+                        self._add_packages([package])
+                    self.connection.commit()
+                self._search_cache.invalidate()
+                # Rebuilt with the merged names on the next search
+                self._name_filter = None
+        finally:
+            if rebuild:
+                backend.create_indexes()
+                self.connection.commit()
 
     def close(self) -> None:
         """Close the autoimport database."""
-        self.connection.commit()
+        if self._lazy_executor is not None:
+            for future in self._lazy_futures.values():
+                future.cancel()
+            self._lazy_executor.shutdown()
+            self._lazy_executor = None
+        for root in self._roots.values():
+            if root.watcher is not None:
+                root.watcher.stop()
+                root.watcher = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if not self.read_only:
+            self.connection.commit()
+            self.connection.execute("PRAGMA optimize")
         self.connection.close()
 
     def clear_cache(self) -> None:
@@ -314,14 +1547,28 @@ class AutoImport:
         regenerating global names.
 
         """
-        self.connection.execute("drop table names")
+        self._check_writable()
+        self._backend.clear()
+        self.connection.execute("drop table packages")
+        self.connection.execute("drop table metadata")
+        self.connection.execute("drop table environments")
+        self._search_cache.invalidate()
+        self._name_filter = None
         self._setup_db()
+        self._select_environment()
+        self._save_roots()
         self.connection.commit()
+        if self._get_pragma("auto_vacuum") == 2:
+            self.vacuum()
 
-    def update_path(self, path: Path) -> None:
+    def update_path(self, path: Path, underlined: bool | None = None) -> None:
         """Update the cache for global names in `resource`."""
-        module = self._path_to_module(path)
-        self._del_if_exist(module_name=module.modname, commit=False)
+        self._check_writable()
+        module = self._path_to_module(path, underlined)
+        self._search_cache.invalidate()
+        self._del_if_exist(
+            module.modname, self._get_root(path).package.name, commit=False
+        )
         self._generate_cache(files=[path], underlined=underlined)
 
     def update_package(self, package: str) -> None:
@@ -336,95 +1583,162 @@ class AutoImport:
     def _moved(self, old_path: Path, new_path: Path) -> None:
         if not old_path.is_dir():
             modname = self._path_to_module(old_path).modname
-            self._del_if_exist(modname)
+            self._del_if_exist(modname, self._get_root(old_path).package.name)
             self._generate_cache(files=[new_path])
 
-    def _del_if_exist(self, module_name: str, commit: bool = True) -> None:
-        self.connection.execute("delete from names where module = ?", (module_name,))
+    def _del_if_exist(
+        self, module_name: str, package_name: str | None = None, commit: bool = True
+    ) -> None:
+        self._backend.delete_module(module_name, package_name)
+        self._search_cache.invalidate()
         if commit:
             self.connection.commit()
 
-    def _get_python_folders(self) -> list[Path]:
-        def filter_folders(folder: Path) -> bool:
-            return folder.is_dir() and folder.as_posix() != "/usr/bin"
+    def _get_python_paths(self) -> list[Path]:
+        """Get the folders and zip archives on sys.path."""
+
+        def filter_paths(path: Path) -> bool:
+            if path.is_dir():
+                return path.as_posix() != "/usr/bin"
+            return is_archive(path)
 
-        folders = sys.path
-        folder_paths = map(lambda folder: Path(folder), folders)
-        filtered_paths = filter(filter_folders, folder_paths)
+        paths = map(lambda path: Path(path), sys.path)
+        filtered_paths = filter(filter_paths, paths)
         return list(OrderedDict.fromkeys(filtered_paths))
 
+    def _iter_packages(self) -> Iterator[Package]:
+        """Iterate over the packages on sys.path, in its order."""
+        for path in self._get_python_paths():
+            yield from self._iter_path_packages(path)
+
+    def _iter_path_packages(self, path: Path) -> Iterator[Package]:
+        """Iterate over the packages in a sys.path folder or archive."""
+        if not path.is_dir():
+            yield from get_archive_packages(path, self.roots)
+            return
+        for package in path.iterdir():
+            package_tuple = get_package_tuple(package, self.roots)
+            if package_tuple is not None:
+                yield package_tuple
+
     def update_module(self, module: str) -> None:
         self._generate_cache(package_names=[module])
 
-    def _get_available_packages(self) -> None:
-
-        for folder in self._get_python_folders():
-            for package in folder.iterdir():
-                package_tuple = get_package_tuple(package, self.project)
-                if package_tuple is None:
-                    continue
-                packages.append(package_tuple)
-        return packages
+    def _get_available_packages(self) -> list[Package]:
+        return list(self._iter_packages())
 
     def _add_packages(self, packages: list[Package]) -> None:
         for package in packages:
-            self.connection.execute("INSERT into packages values(?)", (package.name,))
+            if self._catalogue is not None:
+                self._catalogue.pop(package.name, None)
+            self.connection.execute(
+                "INSERT into packages values(?, ?, ?)",
+                (package.name, self._environment_id, package.modified),
+            )
+            if package.type == PackageType.ARCHIVE:
+                self.connection.execute(
+                    "insert or replace into metadata values (?, ?)",
+                    (
+                        self._environment_key(f"archive:{package.name}"),
+                        _archive_stamp(package),
+                    ),
+                )
+
+    def _refresh_archives(self, packages: list[Package], existing: list[str]) -> None:
+        """
+        Forget the packages whose archive changed since they were indexed,
+        so that they are indexed again.
+        """
+        for package in packages:
+            if package.type != PackageType.ARCHIVE or package.name not in existing:
+                continue
+            stamp = self._get_metadata(self._environment_key(f"archive:{package.name}"))
+            if stamp == _archive_stamp(package):
+                continue
+            self._forget_package(package.name)
+            self._unready(self._get_tier(package))
+            existing.remove(package.name)
 
     def _get_existing(self) -> list[str]:
         existing: list[str] = list(
-            chain(*self.connection.execute("select * from packages").fetchall())
+            chain(
+                *self.connection.execute(
+                    "select package from packages where env = ?",
+                    (self._environment_id,),
+                )
+            )
         )
-        existing.append(self.project_package.name)
+        existing.extend(root.package.name for root in self._roots.values())
         return existing
 
     def remove(self, location: Path) -> None:
+        self._check_writable()
         if location.is_dir():
             for file in location.glob("*.py"):
                 self.remove(file)
         else:
             modname = self._path_to_module(location).modname
-            self._del_if_exist(modname)
+            package_name = self._get_root(location).package.name
+            self._del_if_exist(modname, package_name, commit=location.exists())
+            if not location.exists():
+                # Might have been a package, so remove its submodules too
+                self._del_submodules(modname, package_name)
+
+    def _del_package_if_exist(self, package_name: str, commit: bool = True) -> None:
+        self._backend.delete_package(package_name)
+        self._search_cache.invalidate()
+        if commit:
+            self.connection.commit()
+
+    def _del_submodules(
+        self, module_name: str, package_name: str | None = None, commit: bool = True
+    ) -> None:
+        self._backend.delete_submodules(module_name, package_name)
+        self._search_cache.invalidate()
+        if commit:
+            self.connection.commit()
 
     def _add_names(self, names: Iterable[Name]) -> None:
-        for name in names:
-            self._add_name(name)
+        names = list(names)
+        name_filter = self._name_filter
+        if name_filter is not None:
+            # A module's last component is the same for each of its names
+            keys = {name.name for name in names}
+            keys.update(name.modname.rsplit(".", 1)[-1] for name in names)
+            for key in keys:
+                name_filter.add(key.translate(_ASCII_LOWER))
+        self._backend.add_names(names)
+        # After writing, so a search running meanwhile doesn't cache the old names
+        self._search_cache.invalidate()
 
     def _add_name(self, name: Name) -> None:
-        self.connection.execute(
-            "insert into names values (?,?,?,?,?)",
-            (
-                name.name,
-                name.modname,
-                name.package,
-                name.source.value,
-                name.name_type.value,
-            ),
-        )
+        self._add_names([name])
 
     def _find_package_path(self, target_name: str) -> Package | None:
         if target_name in sys.builtin_module_names:
             return Package(target_name, Source.BUILTIN, None, PackageType.BUILTIN)
-        for folder in self._get_python_folders():
-            for package in folder.iterdir():
-                package_tuple = get_package_tuple(package, self.project)
-                if package_tuple is None:
-                    continue
-                if package_tuple.name == target_name:
-                    return package_tuple
-
+        for package in self._iter_packages():
+            if package.name == target_name:
+                return package
         return None
 
-    def _path_to_module(self, path: Path) -> ModuleFile:
+    def _should_cache_underlined(self, source: Source) -> bool:
+        if isinstance(self.underlined, bool):
+            return self.underlined
+        if self.underlined == Underlined.ALL:
+            return True
+        return self.underlined == Underlined.PROJECT and source == Source.PROJECT
+
+    def _path_to_module(self, path: Path, underlined: bool | None = None) -> ModuleFile:
         # TODO check if path is in project scope
         # The project doesn't need its name added to the path,
         # since the standard python file layout accounts for that
         # so we set add_package_name to False
         resource_modname: str = get_modname_from_path(
-            path, self.project, add_package_name=False
-        )
-        underlined = (
-            True if (self.underlined in Underlined.PROJECT, Underlined.ALL) else False
+            path, self._get_root(path).path, add_package_name=False
         )
+        if underlined is None:
+            underlined = self._should_cache_underlined(Source.PROJECT)
         return ModuleFile(
             path,
             resource_modname,
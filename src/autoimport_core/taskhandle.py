@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import threading
+import time
 from abc import ABC, abstractmethod
 from typing import Sequence
 
@@ -89,3 +91,80 @@ class NullJobSet(BaseJobSet):
 
     def get_percent_done(self) -> None:
         pass
+
+
+class InterruptedTaskError(Exception):
+    """The task was stopped before it finished."""
+
+
+class TaskHandle(BaseTaskHandle):
+    """A task handle which can be stopped from another thread."""
+
+    name: str
+    _stopped: threading.Event
+    _jobsets: list[JobSet]
+
+    def __init__(self, name: str = "Task") -> None:
+        self.name = name
+        self._stopped = threading.Event()
+        self._jobsets = []
+
+    def is_stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def create_jobset(self, name: str = "JobSet", count: int | None = None) -> JobSet:
+        jobset = JobSet(self, name, count)
+        self._jobsets.append(jobset)
+        return jobset
+
+    def get_jobsets(self) -> list[JobSet]:
+        return list(self._jobsets)
+
+    def current_jobset(self) -> JobSet | None:
+        """Return the current `JobSet`"""
+        return self._jobsets[-1] if self._jobsets else None
+
+
+class JobSet(BaseJobSet):
+    """Counts the finished jobs of a task, and estimates when it will finish."""
+
+    handle: TaskHandle
+    count: int | None
+    done: int
+    started: float
+
+    def __init__(self, handle: TaskHandle, name: str, count: int | None) -> None:
+        self.handle = handle
+        self.name = name
+        self.count = count
+        self.done = 0
+        self.started = time.monotonic()
+
+    def started_job(self, name: str) -> None:
+        self.job_name = name
+
+    def finished_job(self) -> None:
+        self.done += 1
+
+    def check_status(self) -> None:
+        if self.handle.is_stopped():
+            raise InterruptedTaskError()
+
+    def get_percent_done(self) -> float | None:
+        if not self.count:
+            return None
+        return self.done * 100 / self.count
+
+    def get_elapsed(self) -> float:
+        """Get the seconds since the job set was created."""
+        return time.monotonic() - self.started
+
+    def get_eta(self) -> float | None:
+        """Estimate the seconds until all jobs are finished, from the rate so far."""
+        if not self.count or not self.done:
+            return None
+        rate = self.done / self.get_elapsed()
+        return max(self.count - self.done, 0) / rate
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import pathlib
+import zipfile
 from pathlib import Path
 
 import pytest
@@ -63,6 +64,22 @@ def zlib_path() -> Path:
     yield pathlib.Path(zlib.__file__)
 
 
+@pytest.fixture
+def archive(tmp_path: Path) -> Path:
+    """A zipped egg in site-packages, like easy-install adds to sys.path."""
+    archive = tmp_path / "site-packages" / "zipped.egg"
+    archive.parent.mkdir()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("zipped/__init__.py", "from .core import *\n")
+        zip_file.writestr("zipped/core.py", "def zipped_function(): pass\n")
+        zip_file.writestr("zipped/_private.py", "hidden = 1\n")
+        zip_file.writestr("zipped/sub/deep.py", "deep = 1\n")
+        zip_file.writestr("single.py", "class ZippedClass: pass\n")
+        zip_file.writestr("__main__.py", "")
+        zip_file.writestr("EGG-INFO/PKG-INFO", "")
+    yield archive
+
+
 @pytest.fixture
 def importer(project) -> AutoImport:
     autoimport = AutoImport(project)
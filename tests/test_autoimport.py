@@ -1,10 +1,19 @@
 from __future__ import annotations
 
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import zipfile
+from concurrent.futures import Future, wait
 from pathlib import Path
 
 import pytest
 
-from autoimport_core import AutoImport
+import autoimport_core.sqlite
+from autoimport_core import AutoImport, IndexTier, Source, taskhandle
+from autoimport_core._defs import Name
 
 
 def test_simple_case(importer: AutoImport) -> None:
@@ -110,6 +119,37 @@ def test_search_module(importer: AutoImport) -> None:
     assert import_statement in importer.search("o")
 
 
+def test_search_is_literal(importer: AutoImport, mod1: Path) -> None:
+    mod1.write_text("my_var = None\nmyXvar = None\n")
+    importer.update_path(mod1)
+    assert [("from mod1 import my_var", "my_var")] == importer.search("MY_v")
+    assert [] == importer.search("my%")
+    assert [("import mod1", "mod1")] == importer.search("MOD1", exact_match=True)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "search_name",
+        "search_name_exact",
+        "search_module",
+        "search_module_exact",
+        "search_many",
+        "has_module",
+        "has_name",
+        "delete_module",
+        "delete_package",
+        "delete_submodules",
+        "delete_package_module",
+        "delete_package_submodules",
+    ],
+)
+def test_queries_use_indexes(importer: AutoImport, query: str) -> None:
+    plans = {plan.name: plan for plan in importer.explain_queries()}
+    assert plans[query].steps
+    assert plans[query].full_scans == []
+
+
 def test_search(importer: AutoImport) -> None:
     importer.update_module("typing")
     import_statement = ("from typing import Dict", "Dict")
@@ -120,12 +160,548 @@ def test_search(importer: AutoImport) -> None:
     assert import_statement in importer.search("D")
 
 
-def test_generate_full_cache(importer: AutoImport) -> None:
+def test_search_exact_after_update(importer: AutoImport, mod1: Path) -> None:
+    assert [] == importer.search("myvar", exact_match=True)
+    mod1.write_text("myvar = None\n")
+    importer.update_path(mod1)
+    assert [("from mod1 import myvar", "myvar")] == importer.search(
+        "myvar", exact_match=True
+    )
+    assert [("import mod1", "mod1")] == importer.search("mod1", exact_match=True)
+
+
+def test_search_many(importer: AutoImport, mod1: Path) -> None:
+    importer.update_module("typing")
+    importer.update_module("packaging")
+    mod1.write_text("Dict = None\n")
+    importer.update_path(mod1)
+    results = importer.search_many(["Dict", "requirements", "typing", "not_a_name"])
+    assert results["Dict"][0] == ("from mod1 import Dict", "Dict")
+    assert ("from typing import Dict", "Dict") in results["Dict"]
+    assert ("from packaging import requirements", "requirements") in results[
+        "requirements"
+    ]
+    assert ("import typing", "typing") in results["typing"]
+    assert results["not_a_name"] == []
+    for name, name_results in results.items():
+        assert set(name_results) <= set(importer.search(name, exact_match=True))
+
+
+def test_find_missing_imports(importer: AutoImport, mod1: Path) -> None:
+    importer.update_module("typing")
+    mod1.write_text(
+        "import os\n\ndef func(path: Text) -> Dict:\n    return unknown_name\n"
+    )
+    missing = importer.find_missing_imports(mod1)
+    assert missing.keys() == {"Text", "Dict", "unknown_name"}
+    assert "from typing import Dict" in missing["Dict"]
+    assert missing["unknown_name"] == []
+    assert missing == importer.find_missing_imports(mod1.read_text())
+
+
+def test_lazy_indexing(project: Path) -> None:
+    importer = AutoImport(project, lazy=True)
+    try:
+        assert ("import packaging", "packaging") in importer.search("packag")
+        assert ("import packaging", "packaging") in importer.search(
+            "packaging", exact_match=True
+        )
+        wait(importer._lazy_futures.values())
+        assert ("from packaging import requirements", "requirements") in (
+            importer.search("requirements")
+        )
+        assert ("import packaging", "packaging") not in importer.search("packag")
+        assert "packaging" in importer._get_existing()
+    finally:
+        importer.close()
+
+
+def test_lazy_indexing_failure(project: Path, caplog: pytest.LogCaptureFixture) -> None:
+    importer = AutoImport(project, lazy=True)
+    try:
+        assert importer._catalogue is not None
+        failed: Future[list[Name]] = Future()
+        failed.set_exception(SyntaxError("broken"))
+        importer._lazy_futures["packaging"] = failed
+        # Searches aren't failed by it, but the package is no longer offered
+        assert [] == importer.search("packaging", exact_match=True)
+        assert "packaging could not be indexed" in caplog.text
+        assert "packaging" not in importer._catalogue
+    finally:
+        importer.close()
+
+
+def test_lazy_search_many(project: Path) -> None:
+    (project / "pyproject.toml").write_text(
+        '[project]\nname = "app"\ndependencies = ["packaging"]\n'
+    )
+    importer = AutoImport(project, lazy=True)
+    try:
+        assert {
+            "packaging": [("import packaging", "packaging")],
+            "requirements": [],
+        } == importer.search_many(["packaging", "requirements"])
+        wait(importer._lazy_futures.values())
+        assert ("from packaging import requirements", "requirements") in (
+            importer.search_many(["requirements"])["requirements"]
+        )
+    finally:
+        importer.close()
+
+
+def test_lazy_indexing_on_miss(project: Path) -> None:
+    importer = AutoImport(project, lazy=True)
+    try:
+        # Without declared dependencies, a miss doesn't index anything
+        assert [] == importer.search("not_a_name_anywhere", exact_match=True)
+        assert {} == importer._lazy_futures
+    finally:
+        importer.close()
+    (project / "pyproject.toml").write_text(
+        '[project]\nname = "app"\ndependencies = ["packaging"]\n'
+    )
+    importer = AutoImport(project, lazy=True)
+    try:
+        assert [] == importer.search("not_a_name_anywhere", exact_match=True)
+        assert ["packaging"] == list(importer._lazy_futures)
+    finally:
+        importer.close()
+
+
+def test_tier_order(importer: AutoImport, mod1: Path) -> None:
+    importer.prefs.dependencies = ["packaging"]
+    tiers = importer._plan_cache(["sys", "packaging", "pytest"], None, None)
+    assert [tier for tier, _ in tiers] == list(IndexTier)
+    packages = {
+        tier: {package.name for _, package in to_index} for tier, to_index in tiers
+    }
+    assert packages == {
+        IndexTier.PROJECT: set(),
+        IndexTier.DEPENDENCIES: {"packaging"},
+        IndexTier.STANDARD: {"sys"},
+        IndexTier.SITE_PACKAGES: {"pytest"},
+    }
+    assert [(IndexTier.PROJECT, [mod1])] == [
+        (tier, [module.filepath for module, _ in to_index])
+        for tier, to_index in importer._plan_cache(None, [mod1], None)
+        if to_index
+    ]
+
+
+def test_ready_tiers(importer: AutoImport) -> None:
+    importer._generate_cache(package_names=["sys"])
+    assert set() == importer.get_ready_tiers()
+    importer._index_tier(IndexTier.PROJECT, [], True, taskhandle.NullTaskHandle(), True)
+    assert {IndexTier.PROJECT} == importer.get_ready_tiers()
+    importer.clear_cache()
+    assert set() == importer.get_ready_tiers()
+
+
+def test_ready_tiers_reset(
+    importer: AutoImport, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    importer._set_ready_tiers(set(IndexTier))
+    monkeypatch.setattr(importer, "_get_available_packages", list)
+    task_handle = taskhandle.TaskHandle()
+    task_handle.stop()
+    # A full generation which is stopped before indexing anything
+    importer._generate_cache(task_handle=task_handle)
+    assert set() == importer.get_ready_tiers()
+
+
+class StopAfterJobSet(taskhandle.JobSet):
+    def finished_job(self) -> None:
+        super().finished_job()
+        if self.done == 1:
+            self.handle.stop()
+
+
+class StopAfterTaskHandle(taskhandle.TaskHandle):
+    def create_jobset(
+        self, name: str = "JobSet", count: int | None = None
+    ) -> taskhandle.JobSet:
+        return StopAfterJobSet(self, name, count)
+
+
+def test_resume_stopped_indexing(importer: AutoImport) -> None:
+    task_handle = StopAfterTaskHandle()
+    importer._generate_cache(
+        package_names=["sys", "packaging"],
+        task_handle=task_handle,
+        single_thread=True,
+    )
+    assert [("from sys import exit", "exit")] == importer.search("exit")
+    # packaging was not finished, so none of it is committed
+    assert [] == importer.search("requirements")
+    assert ["sys"] == [package for package, in importer._dump_all()[1]]
+    importer._generate_cache(package_names=["sys", "packaging"])
+    assert ("from packaging import requirements", "requirements") in importer.search(
+        "requirements"
+    )
+    assert [("from sys import exit", "exit")] == importer.search("exit")
+
+
+def test_stop_multiprocess_indexing(importer: AutoImport) -> None:
+    task_handle = taskhandle.TaskHandle()
+    task_handle.stop()
+    importer._generate_cache(package_names=["packaging"], task_handle=task_handle)
+    assert [] == importer._dump_all()[1]
+
+
+def test_resume_stopped_sharded_indexing(
+    importer: AutoImport, project: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(autoimport_core.sqlite, "_SHARD_MODULES", 2)
+    importer._generate_cache(
+        package_names=["packaging"], task_handle=StopAfterTaskHandle(), sharded=True
+    )
+    # The shards of an unfinished package aren't merged
+    assert ([], []) == importer._dump_all()
+    importer._generate_cache(package_names=["packaging"], sharded=True)
+    expected = AutoImport(project)
+    expected._generate_cache(package_names=["packaging"])
+    names = importer._dump_all()[0]
+    assert len(names) == len(set(names))
+    assert sorted(names) == sorted(expected._dump_all()[0])
+    expected.close()
+
+
+def test_generate_full_cache(importer: AutoImport, project: Path, mod1: Path) -> None:
+    mod1.write_text("myvar = None\n")
+    (project / "build").mkdir()
+    (project / "build" / "mod1.py").write_text("othervar = None\n")
     # The single thread test takes much longer than the multithread test
     # but it is easier to debug
     single_thread = False
     importer._generate_cache (single_thread=single_thread)
     assert ("from typing import Dict", "Dict") in importer.search("Dict")
+    assert [("from mod1 import myvar", "myvar")] == importer.search("myvar")
+    assert set(IndexTier) == importer.get_ready_tiers()
+    assert [] == importer.search("othervar")
     assert len(importer._dump_all()) > 0
     for table in importer._dump_all():
         assert len(table) > 0
+
+
+def test_generate_sharded_cache(
+    importer: AutoImport, project: Path, mod1: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    mod1.write_text("myvar = None\n")
+    # Split packages between several shards
+    monkeypatch.setattr(autoimport_core.sqlite, "_SHARD_MODULES", 2)
+    importer._generate_cache(files=[mod1], sharded=True)
+    importer._generate_cache(package_names=["packaging", "json"], sharded=True)
+    expected = AutoImport(project)
+    expected._generate_cache(files=[mod1])
+    expected._generate_cache(package_names=["packaging", "json"])
+    names, packages = importer._dump_all()
+    assert set(names) == set(expected._dump_all()[0])
+    assert sorted(packages) == [("json",), ("packaging",)]
+    expected.close()
+    assert [("from mod1 import myvar", "myvar")] == importer.search("myvar")
+    # The indexes dropped while merging are back
+    assert all(not plan.full_scans for plan in importer.explain_queries()[:4])
+
+
+def test_search_async(importer: AutoImport) -> None:
+    importer.update_module("typing")
+
+    async def search() -> list[tuple[str, str]]:
+        return [
+            (result.import_statement, result.name)
+            async for result in importer.search_async("Dict", chunk_size=1)
+        ]
+
+    assert ("from typing import Dict", "Dict") in asyncio.run(search())
+
+
+def test_update_paths_async(importer: AutoImport, mod1: Path, mod2: Path) -> None:
+    mod1.write_text("myvar = None\n")
+    mod2.write_text("myvar = None\n")
+    asyncio.run(importer.update_paths_async([mod1, mod2]))
+    assert {
+        ("from mod1 import myvar", "myvar"),
+        ("from pkg.mod2 import myvar", "myvar"),
+    } == set(importer.search("myvar"))
+
+
+def test_generate_cache_async(importer: AutoImport) -> None:
+    asyncio.run(importer.generate_cache_async(package_names=["sys"]))
+    assert [("from sys import exit", "exit")] == importer.search("exit")
+
+
+def test_get_stats(importer: AutoImport, mod1: Path) -> None:
+    mod1.write_text("myvar = None\nmyfunc = None\n")
+    importer.update_path(mod1)
+    importer.update_module("typing")
+    stats = importer.get_stats()
+    assert stats.names_per_source[Source.PROJECT] == 2
+    assert stats.names == sum(stats.names_per_source.values())
+    assert stats.names_per_package["typing"] > 0
+    assert stats.packages == 1
+    assert stats.size == stats.page_size * stats.page_count > 0
+
+
+def test_maintenance(project: Path, mod1: Path, tmp_path: Path) -> None:
+    importer = AutoImport(project, index=str(tmp_path / "index.db"))
+    mod1.write_text("".join(f"name{index} = None\n" for index in range(2000)))
+    importer.update_path(mod1)
+    mod1.write_text("")
+    importer.update_path(mod1)
+    assert importer.get_stats().free_pages > 0
+    importer.vacuum()
+    assert importer.get_stats().free_pages == 0
+    importer.optimize(analyze=True)
+    importer.maintain()
+    assert importer.check_integrity(quick=False) == []
+    importer.close()
+
+
+def test_maintain_after_large_index(
+    importer: AutoImport, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr("autoimport_core.sqlite._MAINTENANCE_MODULES", 1)
+    importer._generate_cache(package_names=["typing"], single_thread=True)
+    assert importer.connection.execute(
+        "SELECT count(*) FROM sqlite_stat1 WHERE tbl = 'names'"
+    ).fetchone()[0]
+
+
+def test_read_only(project: Path, mod1: Path, tmp_path: Path) -> None:
+    index = str(tmp_path / "index.db")
+    writer = AutoImport(project, index=index)
+    mod1.write_text("myvar = None\n")
+    writer.update_path(mod1)
+    writer.update_module("typing")
+    writer.close()
+    readers = [AutoImport(project, index=index, read_only=True) for _ in range(2)]
+    for reader in readers:
+        assert [("from mod1 import myvar", "myvar")] == reader.search("myva")
+        assert ("import typing", "typing") in reader.search_many(["typing"])["typing"]
+        with pytest.raises(sqlite3.OperationalError):
+            reader.update_path(mod1)
+        with pytest.raises(sqlite3.OperationalError):
+            reader.clear_cache()
+    for reader in readers:
+        reader.close()
+
+
+def test_read_only_needs_file(project: Path) -> None:
+    with pytest.raises(ValueError):
+        AutoImport(project, read_only=True)
+
+
+def test_multiple_roots(importer: AutoImport, project: Path, tmp_path: Path) -> None:
+    other = tmp_path / "other"
+    other.mkdir()
+    importer.add_root(other)
+    assert importer.roots == [project, other]
+    mine = project / "utils.py"
+    mine.write_text("mine = None\n")
+    theirs = other / "utils.py"
+    theirs.write_text("theirs = None\n")
+    importer.update_path(mine)
+    importer.update_path(theirs)
+    assert [("from utils import mine", "mine")] == importer.search("mine")
+    assert [("from utils import theirs", "theirs")] == importer.search("theirs")
+    # Modules with the same name in different roots are updated separately
+    theirs.write_text("changed = None\n")
+    importer.update_path(theirs)
+    assert [("from utils import mine", "mine")] == importer.search("mine")
+    assert [] == importer.search("theirs")
+    importer.remove_root(other)
+    assert importer.roots == [project]
+    assert [] == importer.search("changed")
+    assert [("from utils import mine", "mine")] == importer.search("mine")
+    with pytest.raises(ValueError):
+        importer.remove_root(project)
+
+
+def test_search_root(
+    importer: AutoImport, project: Path, tmp_path_factory: pytest.TempPathFactory
+) -> None:
+    other = tmp_path_factory.mktemp("other")
+    (other / "helpers").mkdir()
+    importer.add_root(other)
+    (project / "utils.py").write_text("mine = None\n")
+    (other / "utils.py").write_text("theirs = None\n")
+    (other / "helpers" / "parsing.py").write_text("value = 1\n")
+    importer.update_module("typing")
+    importer._generate_cache(single_thread=True, files=list(other.rglob("*.py")))
+    importer.update_path(project / "utils.py")
+    assert [("from utils import mine", "mine")] == importer.search("mine", root=project)
+    assert [] == importer.search("theirs", root=project)
+    assert [("from utils import theirs", "theirs")] == importer.search(
+        "theirs", root=other
+    )
+    assert [("from helpers import parsing", "parsing")] == importer.search(
+        "parsing", True, root=other
+    )
+    assert [] == importer.search("parsing", True, root=project)
+    # Names which aren't from a project are found from every root
+    assert ("from typing import Dict", "Dict") in importer.search("Dict", root=other)
+    assert {"theirs": [], "Dict": [("from typing import Dict", "Dict")]} == (
+        importer.search_many(["theirs", "Dict"], root=project)
+    )
+    with pytest.raises(ValueError):
+        importer.search("mine", root=other / "helpers")
+
+
+def test_roots_are_stored(project: Path, tmp_path: Path) -> None:
+    index = str(tmp_path / "index.db")
+    other = tmp_path / "other"
+    gone = tmp_path / "gone"
+    other.mkdir()
+    gone.mkdir()
+    (other / "utils.py").write_text("theirs = None\n")
+    (gone / "old.py").write_text("old = None\n")
+    importer = AutoImport(project, index=index)
+    importer.add_root(other)
+    importer.add_root(gone)
+    importer.update_path(other / "utils.py")
+    importer.update_path(gone / "old.py")
+    importer.close()
+    shutil.rmtree(gone)
+    importer = AutoImport(project, index=index)
+    assert importer.roots == [project, other]
+    # The names of roots which no longer exist are removed
+    assert [] == importer.search("old")
+    assert [("from utils import theirs", "theirs")] == importer.search("theirs")
+    importer.remove_root(other)
+    importer.close()
+    importer = AutoImport(project, index=index)
+    assert importer.roots == [project]
+    assert [] == importer.search("theirs")
+    importer.close()
+
+
+def test_nested_root(importer: AutoImport, project: Path) -> None:
+    nested = project / "services" / "api"
+    nested.mkdir(parents=True)
+    importer.add_root(nested)
+    module = nested / "handlers.py"
+    module.write_text("handle = None\n")
+    importer.update_path(module)
+    assert [("from handlers import handle", "handle")] == importer.search(
+        "handle", True
+    )
+    assert importer._get_root(module).path == nested
+
+
+def test_sibling_root(
+    importer: AutoImport,
+    tmp_path_factory: pytest.TempPathFactory,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # Not deeper than the project
+    sibling = tmp_path_factory.mktemp("sibling")
+    importer.add_root(sibling)
+    module = sibling / "helpers.py"
+    module.write_text("helper = None\n")
+    assert importer._get_root(module).path == sibling
+    importer.update_path(module)
+    assert [("from helpers import helper", "helper")] == importer.search("helper", True)
+    importer.clear_cache()
+    # Only index the roots
+    monkeypatch.setattr(importer, "_get_available_packages", list)
+    importer._generate_cache(single_thread=True)
+    assert [("from helpers import helper", "helper")] == importer.search("helper", True)
+
+
+def test_index_archive(
+    importer: AutoImport, archive: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.syspath_prepend(str(archive))
+    importer.update_module("zipped")
+    importer.update_module("single")
+    assert [("from zipped.core import zipped_function", "zipped_function")] == (
+        importer.search("zipped_f")
+    )
+    assert [("from single import ZippedClass", "ZippedClass")] == importer.search(
+        "ZippedC"
+    )
+    # Unchanged archives are skipped, changed ones are indexed again
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("zipped/__init__.py", "def renamed(): pass\n")
+    os.utime(archive, (0, 0))
+    importer.update_module("zipped")
+    assert [] == importer.search("zipped_f")
+    assert [("from zipped import renamed", "renamed")] == importer.search("renamed")
+
+
+def test_environments(
+    project: Path,
+    mod1: Path,
+    tmp_path_factory: pytest.TempPathFactory,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # Outside of the project, whose packages are shared by every environment
+    environments = tmp_path_factory.mktemp("environments")
+    index = str(environments / "index.db")
+    mod1.write_text("project_name = None\n")
+    paths = {}
+    for name in ("alpha", "beta"):
+        paths[name] = environments / name
+        (paths[name] / name).mkdir(parents=True)
+        (paths[name] / name / "__init__.py").write_text(f"{name}_name = None\n")
+    original = list(sys.path)
+
+    def open_in(name: str) -> AutoImport:
+        monkeypatch.setattr(sys, "path", [str(paths[name]), *original])
+        return AutoImport(project, index=index)
+
+    importer = open_in("alpha")
+    importer.update_path(mod1)
+    importer.update_module("alpha")
+    importer.close()
+    importer = open_in("beta")
+    assert [] == importer.search("alpha_name")
+    # Project names are shared by every environment
+    assert [("from mod1 import project_name", "project_name")] == importer.search(
+        "project_name"
+    )
+    importer.update_module("beta")
+    importer.close()
+    importer = open_in("alpha")
+    assert [("from alpha import alpha_name", "alpha_name")] == importer.search(
+        "alpha_name"
+    )
+    assert [] == importer.search("beta_name")
+    assert importer.get_stats().environments == 2
+    importer.close()
+    # Packages removed while using another environment are forgotten
+    (paths["alpha"] / "alpha" / "__init__.py").unlink()
+    (paths["alpha"] / "alpha").rmdir()
+    os.utime(paths["alpha"], (0, 0))
+    importer = open_in("alpha")
+    assert [] == importer.search("alpha_name")
+    importer.close()
+
+
+def test_forget_changed_packages(
+    project: Path,
+    tmp_path_factory: pytest.TempPathFactory,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    site = tmp_path_factory.mktemp("site")
+    index = str(tmp_path_factory.mktemp("index") / "index.db")
+    for name in ("kept", "upgraded"):
+        (site / name).mkdir()
+        (site / name / "__init__.py").write_text(f"{name}_name = None\n")
+        os.utime(site / name, (1, 1))
+    monkeypatch.syspath_prepend(str(site))
+    importer = AutoImport(project, index=index)
+    importer._generate_cache(package_names=["kept", "upgraded"])
+    importer._set_ready_tiers(set(IndexTier))
+    importer.close()
+    # Installing a package changes its sys.path entry, not the others in it
+    (site / "upgraded" / "__init__.py").write_text("new_name = None\n")
+    os.utime(site / "upgraded", (2, 2))
+    os.utime(site, (3, 3))
+    importer = AutoImport(project, index=index)
+    assert [("kept",)] == importer._dump_all()[1]
+    assert [("from kept import kept_name", "kept_name")] == importer.search("kept_name")
+    assert [] == importer.search("upgraded_name")
+    assert IndexTier.SITE_PACKAGES not in importer.get_ready_tiers()
+    assert IndexTier.STANDARD in importer.get_ready_tiers()
+    importer.close()
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import random
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from autoimport_core import AutoImport, Backend, MemoryBackend, SQLiteBackend, _queries
+from autoimport_core._defs import Name
+from autoimport_core.defs import NameType, Source
+
+
+def make_backend(kind: str) -> Backend:
+    if kind == "memory":
+        return MemoryBackend()
+    backend = SQLiteBackend(sqlite3.connect(":memory:"))
+    backend.setup()
+    return backend
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def backend(request: pytest.FixtureRequest) -> Backend:
+    return make_backend(request.param)
+
+
+def name(name: str, module: str, package: str = "pkg") -> Name:
+    return Name(name, module, package, Source.SITE_PACKAGE, NameType.Function)
+
+
+def test_search(backend: Backend) -> None:
+    backend.add_names(
+        [
+            name("Dict", "typing", "typing"),
+            name("dict_items", "pkg.sub"),
+            name("x", "pkg"),
+        ]
+    )
+    assert {row[1] for row in backend.search_names("DI", False)} == {
+        "Dict",
+        "dict_items",
+    }
+    assert list(backend.search_names("dict", True)) == [
+        ("from typing import Dict", "Dict", 4, NameType.Function.value)
+    ]
+    module = NameType.Module.value
+    assert set(backend.search_modules("SU", False)) == {
+        ("from pkg import sub", "sub", 4, module)
+    }
+    assert set(backend.search_modules("pkg", True)) == {
+        ("import pkg", "pkg", 4, module)
+    }
+    assert set(backend.search_many({"Dict", "dict", "sub"})) == {
+        ("from typing import Dict", "Dict", 4),
+        ("from pkg import sub", "sub", 4),
+    }
+
+
+def test_delete(backend: Backend) -> None:
+    backend.add_names(
+        [
+            name("a", "pkg"),
+            name("b", "pkg.sub"),
+            name("c", "pkg.sub.deep"),
+            name("d", "other", "other"),
+        ]
+    )
+    backend.delete_submodules("pkg")
+    assert sorted(row[0] for row in backend.iter_rows()) == ["a", "d"]
+    backend.delete_package("pkg")
+    assert [row[0] for row in backend.iter_rows()] == ["d"]
+    backend.delete_module("other")
+    assert list(backend.iter_rows()) == []
+    assert list(backend.search_modules("", False)) == []
+
+
+def test_memory_matches_sqlite() -> None:
+    rng = random.Random(0)
+    sqlite_backend = make_backend("sqlite")
+    memory_backend = make_backend("memory")
+    modules = [f"pkg{index % 3}.mod{index}" for index in range(30)]
+    for step in range(300):
+        module = rng.choice(modules)
+        if rng.random() < 0.2:
+            for backend in (sqlite_backend, memory_backend):
+                backend.delete_module(module)
+            continue
+        names = [
+            name("".join(rng.choice("aAbB_") for _ in range(3)), module, module[:4])
+            for _ in range(rng.randrange(1, 20))
+        ]
+        for backend in (sqlite_backend, memory_backend):
+            backend.add_names(names)
+        query = "".join(rng.choice("aAbB_") for _ in range(rng.randrange(0, 3)))
+        exact_match = rng.random() < 0.3
+        assert sorted(sqlite_backend.search_names(query, exact_match)) == sorted(
+            memory_backend.search_names(query, exact_match)
+        )
+        assert sorted(sqlite_backend.search_modules(query, exact_match)) == sorted(
+            memory_backend.search_modules(query, exact_match)
+        )
+    sqlite_backend.delete_package("pkg1")
+    memory_backend.delete_package("pkg1")
+    assert sorted(sqlite_backend.iter_rows()) == sorted(memory_backend.iter_rows())
+    assert sqlite_backend.count_names() == memory_backend.count_names()
+
+
+def test_autoimport_memory_backend(project: Path, mod1: Path) -> None:
+    importer = AutoImport(project, backend=MemoryBackend())
+    mod1.write_text("myvar = None\n")
+    importer.update_path(mod1)
+    importer.update_module("typing")
+    assert [("from mod1 import myvar", "myvar")] == importer.search("myva")
+    assert ("from typing import Dict", "Dict") in importer.search("Dict", True)
+    assert ("import typing", "typing") in importer.search_many(["typing"])["typing"]
+    assert importer.get_stats().names_per_source[Source.PROJECT] == 1
+    assert importer.explain_queries() == []
+    mod1.write_text("")
+    importer.update_path(mod1)
+    assert [] == importer.search("myva")
+    importer.close()
+
+
+def test_memory_backend_needs_memory_index(project: Path, tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="doesn't persist names"):
+        AutoImport(project, index=str(tmp_path / "index.db"), backend=MemoryBackend())
+    assert not (tmp_path / "index.db").exists()
+
+
+def test_delete_from_package(backend: Backend) -> None:
+    backend.add_names(
+        [
+            name("a", "utils", "root"),
+            name("b", "utils", "other"),
+            name("c", "utils.sub", "root"),
+            name("d", "utils.sub", "other"),
+        ]
+    )
+    backend.delete_submodules("utils", "other")
+    assert sorted(row[0] for row in backend.iter_rows()) == ["a", "b", "c"]
+    backend.delete_module("utils", "root")
+    assert sorted(row[0] for row in backend.iter_rows()) == ["b", "c"]
+
+
+def test_sqlite_environments() -> None:
+    connection = sqlite3.connect(":memory:")
+    # Indexed before environments were tracked
+    connection.execute(
+        "create table names"
+        "(name TEXT, module TEXT, package TEXT, source INTEGER, type INTEGER)"
+    )
+    connection.executemany(
+        "insert into names values (?, ?, ?, ?, ?)",
+        [
+            ("old", "pkg", "pkg", Source.SITE_PACKAGE.value, 0),
+            ("mine", "app", "app", Source.PROJECT.value, 0),
+        ],
+    )
+    backend = SQLiteBackend(connection)
+    backend.setup()
+    backend.environment = 2
+    backend.add_names(
+        [
+            name("new", "pkg"),
+            Name("ours", "app", "app", Source.PROJECT, NameType.Function),
+        ]
+    )
+    assert {row[1] for row in backend.search_names("", False)} == {
+        "mine",
+        "ours",
+        "new",
+    }
+    backend.environment = 1
+    assert {row[1] for row in backend.search_names("", False)} == {
+        "mine",
+        "ours",
+        "old",
+    }
+    backend.delete_package("pkg")
+    backend.environment = 2
+    assert [row[1] for row in backend.search_names("new", True)] == ["new"]
+
+
+def test_sqlite_merge_shard(tmp_path: Path) -> None:
+    shard = SQLiteBackend(sqlite3.connect(tmp_path / "shard.db"))
+    shard.environment = 2
+    shard.create_table()
+    shard.add_names([name("Dict", "typing", "typing")])
+    shard.connection.commit()
+    shard.connection.close()
+    backend = make_backend("sqlite")
+    assert isinstance(backend, SQLiteBackend)
+    backend.drop_indexes()
+    with backend.merge_shard(str(tmp_path / "shard.db")):
+        backend.connection.commit()
+    with backend.merge_shard(str(tmp_path / "shard.db")):
+        pass  # Not committed
+    backend.create_indexes()
+    backend.environment = 2
+    assert backend.count() == 1
+    assert [row[1] for row in backend.search_names("dict", True)] == ["Dict"]
+    assert not any(plan.full_scans for plan in backend.explain()[:4])
+
+
+def test_read_only_legacy_index(project: Path, tmp_path: Path) -> None:
+    index = tmp_path / "index.db"
+    connection = sqlite3.connect(index)
+    # Built before environments were tracked
+    connection.execute(
+        "create table names"
+        "(name TEXT, module TEXT, package TEXT, source INTEGER, type INTEGER)"
+    )
+    for statement in _queries.CREATE_INDEXES:
+        connection.execute(statement)
+    connection.execute("create table packages(package TEXT)")
+    connection.execute("create table metadata(key TEXT PRIMARY KEY, value TEXT)")
+    connection.executemany(
+        "insert into names values (?, ?, ?, ?, ?)",
+        [
+            ("Dict", "typing", "typing", Source.STANDARD.value, 0),
+            ("mine", "app", "app", Source.PROJECT.value, 0),
+        ],
+    )
+    connection.execute("insert into packages values ('typing')")
+    connection.commit()
+    connection.close()
+    reader = AutoImport(project, index=str(index), read_only=True)
+    assert [("from typing import Dict", "Dict")] == reader.search("Dict", True)
+    assert [("from app import mine", "mine")] == reader.search("mine")
+    assert ("import typing", "typing") in reader.search_many(["typing"])["typing"]
+    assert reader.get_stats().packages == 1
+    # The views still search with the indexes of the legacy table
+    sql, parameters = _queries.EXAMPLES["search_name"]
+    assert not _queries.explain(reader.connection, "", sql, parameters).full_scans
+    reader.close()
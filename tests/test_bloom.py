@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from autoimport_core._bloom import BloomFilter
+
+
+def test_no_false_negatives() -> None:
+    names = [f"name_{index}" for index in range(1000)]
+    bloom_filter = BloomFilter.from_items(names)
+    assert all(name in bloom_filter for name in names)
+
+
+def test_false_positive_rate() -> None:
+    bloom_filter = BloomFilter.from_items(f"name_{index}" for index in range(1000))
+    false_positives = sum(f"missing_{index}" in bloom_filter for index in range(10000))
+    assert false_positives < 200
+
+
+def test_full() -> None:
+    bloom_filter = BloomFilter(2)
+    for name in ("a", "b"):
+        bloom_filter.add(name)
+    assert not bloom_filter.full
+    bloom_filter.add("c")
+    assert bloom_filter.full
+
+
+def test_duplicates_not_counted() -> None:
+    bloom_filter = BloomFilter(2)
+    for _ in range(10):
+        bloom_filter.add("a")
+    assert bloom_filter.count == 1
+    assert not bloom_filter.full
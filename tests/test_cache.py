@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from autoimport_core import NameType, SearchResult, Source
+from autoimport_core._cache import SearchCache, filter_results
+
+requests = SearchResult(
+    "import requests", "requests", Source.SITE_PACKAGE, NameType.Module
+)
+request = SearchResult(
+    "from urllib import request", "request", Source.STANDARD, NameType.Module
+)
+request_class = SearchResult(
+    "from requests import Request", "Request", Source.SITE_PACKAGE, NameType.Class
+)
+re_module = SearchResult("import re", "re", Source.STANDARD, NameType.Module)
+results = (requests, request, request_class, re_module)
+
+
+def test_filter_results() -> None:
+    assert {requests, request, request_class} == set(
+        filter_results(results, "req", False)
+    )
+    assert {request, request_class} == set(filter_results(results, "request", True))
+    assert [re_module] == filter_results(results, "re", True)
+
+
+def test_filter_results_literal() -> None:
+    assert [] == filter_results(results, "r_quest%", False)
+
+
+def test_prefix_cache() -> None:
+    cache = SearchCache()
+    cache.put("re", False, results)
+    assert {requests, request, request_class} == set(cache.get("req", False) or ())
+    assert {request_class, request} == set(cache.get("Request", True) or ())
+    assert cache.get("x", False) is None
+
+
+def test_invalidate() -> None:
+    cache = SearchCache()
+    cache.put("re", False, results)
+    cache.invalidate()
+    assert cache.get("re", False) is None
+    assert cache.get("req", False) is None
+
+
+def test_maxsize() -> None:
+    cache = SearchCache(maxsize=1)
+    cache.put("a", False, ())
+    cache.put("b", False, ())
+    assert cache.get("a", False) is None
+    assert cache.get("b", False) == ()
+
+
+def test_put_stale() -> None:
+    cache = SearchCache()
+    generation = cache.generation
+    # The index changed while searching
+    cache.invalidate()
+    cache.put("re", False, results, generation)
+    assert cache.get("re", False) is None
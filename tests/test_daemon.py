@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from autoimport_core.daemon import DaemonClient, DaemonError, IndexDaemon
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="Unix sockets are not available"
+)
+
+
+def start(daemon: IndexDaemon) -> threading.Thread:
+    thread = threading.Thread(target=daemon.serve_forever)
+    thread.start()
+    while daemon._server is None:
+        time.sleep(0.01)
+    return thread
+
+
+@pytest.fixture
+def daemon(tmp_path: Path) -> Iterator[IndexDaemon]:
+    daemon = IndexDaemon(tmp_path / "daemon.sock", tmp_path / "indexes")
+    thread = start(daemon)
+    yield daemon
+    daemon.shutdown()
+    thread.join()
+
+
+def test_search(daemon: IndexDaemon, project: Path, mod1: Path) -> None:
+    with DaemonClient(project, daemon.socket_path) as client:
+        assert client.ping()
+        mod1.write_text("myvar = None\n")
+        client.update_path(mod1)
+        client.update_module("typing")
+        assert [("from mod1 import myvar", "myvar")] == client.search("myva")
+        assert ("from typing import Dict", "Dict") in client.search("Dict", True)
+        assert client.search_many(["myvar", "missing"]) == {
+            "myvar": [("from mod1 import myvar", "myvar")],
+            "missing": [],
+        }
+        client.remove(mod1)
+        assert [] == client.search("myva")
+
+
+def test_clients_share_index(daemon: IndexDaemon, project: Path, mod1: Path) -> None:
+    mod1.write_text("shared = None\n")
+    with DaemonClient(project, daemon.socket_path) as first:
+        first.generate_cache(files=[mod1])
+    with DaemonClient(project, daemon.socket_path) as second:
+        assert [("from mod1 import shared", "shared")] == second.search("shared")
+    assert daemon._importer is not None
+    assert project.resolve() in daemon._importer.roots
+    assert list(daemon.index_dir.glob("*.db"))
+
+
+def test_projects_are_isolated(
+    tmp_path: Path,
+    project: Path,
+    mod1: Path,
+    tmp_path_factory: pytest.TempPathFactory,
+) -> None:
+    other = tmp_path_factory.mktemp("other")
+    (other / "helpers.py").write_text("helper = None\n")
+    mod1.write_text("mine = None\n")
+    daemon = IndexDaemon(tmp_path / "daemon.sock", tmp_path / "indexes")
+    thread = start(daemon)
+    with DaemonClient(project, daemon.socket_path) as first, DaemonClient(
+        other, daemon.socket_path
+    ) as second:
+        first.update_module("typing")
+        first.update_path(mod1)
+        second.generate_cache(files=[other / "helpers.py"])
+        # The packages are indexed once for every project
+        assert ("from typing import Dict", "Dict") in second.search("Dict", True)
+        assert [] == first.search("helper")
+        assert {"helper": []} == first.search_many(["helper"])
+        assert [("from helpers import helper", "helper")] == second.search(
+            "helper", True
+        )
+        assert [] == second.search("mine")
+        second.shutdown()
+    thread.join()
+    assert len(list((tmp_path / "indexes").glob("*.db"))) == 1
+    # The projects are kept when the daemon restarts, until they are closed
+    daemon = IndexDaemon(tmp_path / "daemon.sock", tmp_path / "indexes")
+    thread = start(daemon)
+    with DaemonClient(project, daemon.socket_path) as first:
+        assert [] == first.search("helper")
+        daemon.close_project(str(other))
+        assert daemon._importer is not None
+        assert other.resolve() not in daemon._importer.roots
+        assert [("from mod1 import mine", "mine")] == first.search("mine")
+        first.shutdown()
+    thread.join()
+
+
+def test_search_while_writing(daemon: IndexDaemon, project: Path, mod1: Path) -> None:
+    mod1.write_text("myvar = None\n")
+    with DaemonClient(project, daemon.socket_path, timeout=10) as client:
+        client.update_path(mod1)
+        # As if another client was generating the cache
+        with daemon._write_lock:
+            assert [("from mod1 import myvar", "myvar")] == client.search("myvar")
+
+
+def test_errors(daemon: IndexDaemon, project: Path) -> None:
+    with DaemonClient(project, daemon.socket_path) as client:
+        with pytest.raises(DaemonError, match="Unknown method"):
+            client.request("serch")
+        with pytest.raises(DaemonError, match="TypeError"):
+            client.request("search", project=str(project))
+        # The connection is still usable
+        assert client.ping()
+
+
+def test_already_running(daemon: IndexDaemon) -> None:
+    with pytest.raises(DaemonError, match="already listening"):
+        IndexDaemon(daemon.socket_path).serve_forever()
+
+
+def test_shutdown(tmp_path: Path, project: Path) -> None:
+    daemon = IndexDaemon(tmp_path / "daemon.sock")
+    thread = start(daemon)
+    with DaemonClient(project, daemon.socket_path) as client:
+        client.search("a")
+        client.shutdown()
+    thread.join()
+    assert not daemon.socket_path.exists()
+    assert daemon._importer is None
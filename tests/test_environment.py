@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+from autoimport_core._environment import Environment, get_environment
+
+
+def test_key() -> None:
+    environment = Environment("/usr/bin/python3", "3.11", {"/lib": 1.0})
+    assert environment.key == Environment("/usr/bin/python3", "3.11", {"/lib": 2.0}).key
+    assert environment.key != Environment("/usr/bin/python3", "3.12", {"/lib": 1.0}).key
+    assert environment.key != Environment("/usr/bin/python3", "3.11", {}).key
+
+
+def test_changed_paths() -> None:
+    environment = Environment("python", "3.11", {"/a": 1.0, "/b": 2.0, "/c": 3.0})
+    assert environment.changed_paths({"/a": 1.0, "/b": 1.0}) == ["/b", "/c"]
+    assert environment.changed_paths(environment.paths) == []
+
+
+def test_get_environment(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    missing = tmp_path / "missing"
+    monkeypatch.setattr(sys, "path", ["", str(tmp_path), str(missing)])
+    environment = get_environment()
+    assert environment.interpreter == sys.executable
+    assert environment.paths == {
+        str(tmp_path): tmp_path.stat().st_mtime,
+        str(missing): 0.0,
+    }
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from autoimport_core import AutoImport, _git
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="requires git")
+
+
+def git(project: Path, *args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=project,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+@pytest.fixture
+def repo(project: Path, mod1: Path) -> Path:
+    mod1.write_text("myvar = None\n")
+    git(project, "init")
+    git(project, "add", ".")
+    git(project, "commit", "-m", "initial")
+    yield project
+
+
+def test_get_changes(repo: Path, mod1: Path, mod2: Path) -> None:
+    first = _git.get_head(repo)
+    assert first is not None
+    git(repo, "mv", "mod1.py", "renamed.py")
+    git(repo, "add", ".")
+    git(repo, "commit", "-m", "second")
+    second = _git.get_head(repo)
+    assert second is not None
+    batch = _git.get_changes(repo, first, second)
+    assert batch is not None
+    assert batch.moved == {mod1: repo / "renamed.py"}
+    assert batch.changed == {mod2}
+
+
+def test_get_dirty_files(repo: Path, mod1: Path, mod2: Path) -> None:
+    assert _git.get_dirty_files(repo) == {mod2: mod2.stat().st_mtime_ns}
+    mod1.unlink()
+    assert _git.get_dirty_files(repo)[mod1] == -1
+
+
+def test_get_head_not_a_repo(project: Path) -> None:
+    assert _git.get_head(project) is None
+
+
+def test_sync_with_git(importer: AutoImport, repo: Path, mod1: Path) -> None:
+    importer.prefs.use_git = True
+    importer.update_path(mod1)
+    importer.sync()
+    mod1.write_text("othervar = None\n")
+    importer.sync()
+    assert [] == importer.search("myvar")
+    assert [("from mod1 import othervar", "othervar")] == importer.search("othervar")
+    git(repo, "mv", "mod1.py", "renamed.py")
+    git(repo, "commit", "-a", "-m", "rename")
+    importer.sync()
+    assert [("from renamed import othervar", "othervar")] == importer.search("othervar")
+
+
+def test_sync_with_git_skips_excluded(
+    importer: AutoImport, repo: Path, mod1: Path
+) -> None:
+    generated = repo / "build" / "generated.py"
+    generated.parent.mkdir()
+    generated.write_text("generated = None\n")
+    git(repo, "add", "--force", ".")
+    git(repo, "commit", "-m", "add a tracked file in an excluded directory")
+    importer.prefs.use_git = True
+    importer.sync()
+    generated.write_text("generated = 1\n")
+    mod1.write_text("othervar = None\n")
+    importer.sync()
+    assert [("from mod1 import othervar", "othervar")] == importer.search("othervar")
+    assert [] == importer.search("generated")
+    git(repo, "commit", "-a", "-m", "change both")
+    git(repo, "mv", "build/generated.py", "moved.py")
+    git(repo, "commit", "-m", "move out of build")
+    importer.sync()
+    assert [("from moved import generated", "generated")] == importer.search(
+        "generated"
+    )
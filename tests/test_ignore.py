@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from autoimport_core._ignore import PathFilter
+
+
+def make_files(project: Path, *names: str) -> None:
+    for name in names:
+        path = project / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+
+def test_exclude(project: Path) -> None:
+    make_files(
+        project,
+        "mod1.py",
+        "pkg/mod2.py",
+        "build/lib/mod1.py",
+        ".venv/lib/site-packages/dep.py",
+        "pkg/generated/mod3.py",
+    )
+    path_filter = PathFilter(project, exclude=[".*", "build", "pkg/generated/"])
+    assert {project / "mod1.py", project / "pkg" / "mod2.py"} == set(path_filter.walk())
+    assert path_filter.is_excluded(project / "build" / "lib" / "mod1.py")
+    assert not path_filter.is_excluded(project / "pkg" / "mod2.py")
+
+
+def test_include(project: Path) -> None:
+    make_files(project, "src/mod1.py", "scripts/run.py")
+    path_filter = PathFilter(project, include=["src/**/*.py"])
+    assert [project / "src" / "mod1.py"] == list(path_filter.walk())
+
+
+def test_gitignore(project: Path) -> None:
+    make_files(project, "mod1.py", "out/mod2.py", "pkg/mod3.py", "pkg/keep.py")
+    (project / ".gitignore").write_text("# comment\nout/\npkg/*.py\n")
+    (project / "pkg" / ".gitignore").write_text("!keep.py\n")
+    path_filter = PathFilter(project, use_gitignore=True)
+    assert {project / "mod1.py", project / "pkg" / "keep.py"} == set(path_filter.walk())
+    assert {project / "mod1.py", project / "out" / "mod2.py"} <= set(
+        PathFilter(project).walk()
+    )
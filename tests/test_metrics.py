@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from autoimport_core import AutoImport, taskhandle
+from autoimport_core.metrics import IndexMetrics, SearchMetrics
+
+
+def test_slowest_modules() -> None:
+    metrics = IndexMetrics(max_slowest=2)
+    metrics.add_module("fast", 1, 0.1)
+    metrics.add_module("slow", 2, 0.5)
+    metrics.add_module("medium", 3, 0.2)
+    assert [("slow", 0.5), ("medium", 0.2)] == metrics.slowest_modules
+    assert metrics.names == 6
+    assert metrics.phases["parsing"] == 0.8
+
+
+def test_search_percentiles() -> None:
+    metrics = SearchMetrics()
+    for _ in range(90):
+        metrics.add(0.000_010)
+    for _ in range(10):
+        metrics.add(0.001)
+    assert metrics.count == 100
+    assert metrics.percentile(50) == 16 / 1e6
+    assert metrics.percentile(99) == 1024 / 1e6
+
+
+def test_index_metrics(importer: AutoImport, mod1: Path) -> None:
+    mod1.write_text("myvar = None\n")
+    importer.update_path(mod1)
+    importer.search("myvar")
+    indexing = importer.metrics.indexing
+    assert indexing.modules == 1
+    assert indexing.names == 1
+    assert indexing.elapsed > 0
+    assert indexing.phases["writes"] > 0
+    assert [name for name, _ in indexing.slowest_modules] == ["mod1"]
+    assert importer.metrics.search.count == 1
+
+
+def test_job_set_eta() -> None:
+    job_set = taskhandle.TaskHandle().create_jobset(count=4)
+    assert job_set.get_eta() is None
+    job_set.started = 0
+    job_set.finished_job()
+    eta = job_set.get_eta()
+    assert eta is not None and eta > 0
+    assert job_set.get_percent_done() == 25
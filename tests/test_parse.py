@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from pathlib import Path
 
-from autoimport_core import Source, _parse
+from autoimport_core import Source, _parse, _utils
 from autoimport_core._defs import Name, NameType, PartialName
 
 
@@ -19,3 +19,39 @@ def test_find_sys() -> None:
 def test_find_underlined() -> None:
     names = list(_parse.get_names_from_compiled("os", Source.BUILTIN, underlined=True))
     assert Name("_exit", "os", "os", Source.BUILTIN, NameType.Function) in names
+
+
+def test_undefined_names() -> None:
+    source = """
+import os
+from typing import List as L
+
+def func(arg, *args, **kwargs) -> L:
+    local = Dict()
+    for item in args:
+        print(item, local, os.sep, kwargs)
+    try:
+        pass
+    except Exception as error:
+        raise error
+    return [value for value in Path(arg).iterdir()]
+
+class Klass(Base):
+    attribute: Text = __name__
+"""
+    assert {"Dict", "Path", "Base", "Text"} == _parse.get_undefined_names(source)
+
+
+def test_undefined_names_syntax_error() -> None:
+    assert set() == _parse.get_undefined_names("this is a syntax error")
+
+
+def test_archive_names(archive: Path) -> None:
+    zipped, _ = _utils.get_archive_packages(archive)
+    modules = {module.modname: module for module in _utils.get_files(zipped)}
+    # Read while listing the archive, which is closed after
+    archive.unlink()
+    names = _parse.get_names(modules["zipped.core"], zipped)
+    assert [(name.name, name.name_type) for name in names] == [
+        ("zipped_function", NameType.Function)
+    ]
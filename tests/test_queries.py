@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import sqlite3
+
+from autoimport_core import QueryPlan
+from autoimport_core._queries import explain, prefix_range
+
+
+def test_prefix_range() -> None:
+    low, high = prefix_range("abc")
+    assert low <= "abc" < high
+    assert low <= "abcdef" < high
+    assert not low <= "abd" < high
+
+
+def test_full_scans() -> None:
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE names(name TEXT)")
+    plan = explain(connection, "scan", "SELECT * FROM names WHERE name LIKE ?", ("a",))
+    assert plan.full_scans == ["SCAN names"]
+    connection.execute("CREATE INDEX name ON names(name COLLATE NOCASE)")
+    plan = explain(connection, "binary", "SELECT * FROM names WHERE name = ?", ("a",))
+    assert plan.full_scans == ["SCAN names"]
+
+
+def test_temp_scans_allowed() -> None:
+    plan = QueryPlan("many", "", ("SCAN temp.search_names", "SCAN (subquery-1)"))
+    assert plan.full_scans == []
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from autoimport_core import AutoImport, SnapshotIndex
+
+
+@pytest.fixture
+def snapshot_path(importer: AutoImport, mod1: Path, tmp_path: Path) -> Path:
+    mod1.write_text("my_var = None\nMyClass = None\nother = None\nmy_var = 1\n")
+    importer.update_path(mod1)
+    importer.update_module("typing")
+    path = tmp_path / "index.snapshot"
+    importer.export_snapshot(path)
+    return path
+
+
+def test_search_matches_database(importer: AutoImport, snapshot_path: Path) -> None:
+    snapshot = SnapshotIndex(snapshot_path)
+    for name in ["my", "MY_V", "myclass", "Dict", "D", "typ", "mod1", "x", "_"]:
+        for exact_match in (True, False):
+            assert set(snapshot.search_full(name, exact_match)) == set(
+                importer.search_full(name, exact_match)
+            ), name
+            assert set(snapshot.search(name, exact_match)) == set(
+                importer.search(name, exact_match)
+            )
+    assert snapshot.packages == ["typing"]
+    snapshot.close()
+
+
+def test_search_full_parity(importer: AutoImport, snapshot_path: Path) -> None:
+    snapshot = SnapshotIndex(snapshot_path)
+    for name in ["my_var", "my", "Dict", "typing"]:
+        for exact_match in (True, False):
+            assert sorted(snapshot.search_full(name, exact_match)) == sorted(
+                importer.search_full(name, exact_match)
+            ), name
+    snapshot.close()
+
+
+def test_import_snapshot(
+    importer: AutoImport, snapshot_path: Path, project: Path
+) -> None:
+    other = AutoImport(project)
+    other.import_snapshot(snapshot_path)
+    other.import_snapshot(snapshot_path)
+    assert other.search("Dict") == importer.search("Dict")
+    assert other.get_stats().names == importer.get_stats().names
+    assert other.get_stats().packages == 1
+    other.close()
+
+
+def test_not_a_snapshot(tmp_path: Path) -> None:
+    path = tmp_path / "index.snapshot"
+    path.write_bytes(b"")
+    with pytest.raises(ValueError):
+        SnapshotIndex(path)
+    path.write_bytes(b"not a snapshot at all, but long enough")
+    with pytest.raises(ValueError):
+        SnapshotIndex(path)
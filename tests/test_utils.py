@@ -69,3 +69,30 @@ def test_get_package_tuple_compiled(zlib_path: Path) -> None:
     assert Package(
         "zlib", Source.STANDARD, zlib_path, PackageType.COMPILED
     ) == _utils.get_package_tuple(zlib_path)
+
+
+def test_get_package_source_venv_in_project(project: Path) -> None:
+    package = project / ".venv" / "lib" / "site-packages" / "dep"
+    assert _utils.get_package_source(package, project, "dep") == Source.SITE_PACKAGE
+
+
+def test_get_archive_packages(archive: Path) -> None:
+    assert _utils.is_archive(archive)
+    packages = _utils.get_archive_packages(archive)
+    assert [package.name for package in packages] == ["zipped", "single"]
+    assert {package.type for package in packages} == {PackageType.ARCHIVE}
+    assert {package.source for package in packages} == {Source.SITE_PACKAGE}
+
+
+def test_get_archive_files(archive: Path) -> None:
+    zipped, single = _utils.get_archive_packages(archive)
+    modules = {module.modname: module for module in _utils.get_files(zipped)}
+    assert sorted(modules) == ["zipped", "zipped.core"]
+    assert modules["zipped"].process_imports
+    assert [module.modname for module in _utils.get_files(single)] == ["single"]
+    assert len(list(_utils.get_files(zipped, underlined=True))) == 3
+
+
+def test_is_archive(project: Path, mod1: Path) -> None:
+    assert not _utils.is_archive(project)
+    assert not _utils.is_archive(mod1)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+import pytest
+
+from autoimport_core import AutoImport
+from autoimport_core._watcher import (
+    ChangeBatch,
+    InotifyWatcher,
+    PollingWatcher,
+    Watcher,
+)
+
+
+def wait_for_batches(watcher: Watcher, timeout: float = 5) -> ChangeBatch:
+    combined = ChangeBatch()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for batch in watcher.get_batches():
+            combined.changed |= batch.changed
+            combined.moved.update(batch.moved)
+            combined.removed |= batch.removed
+        if combined:
+            return combined
+        time.sleep(0.05)
+    return combined
+
+
+def test_coalesce_changes(project: Path) -> None:
+    batch = ChangeBatch()
+    batch.change(project / "a.py")
+    batch.change(project / "a.py")
+    batch.move(project / "a.py", project / "b.py")
+    assert batch.changed == {project / "b.py"}
+    assert batch.removed == {project / "a.py"}
+    batch.move(project / "c.py", project / "d.py")
+    batch.move(project / "d.py", project / "e.py")
+    assert batch.moved == {project / "c.py": project / "e.py"}
+    batch.remove(project / "e.py")
+    assert batch.moved == {}
+    assert project / "c.py" in batch.removed
+
+
+@pytest.fixture(
+    params=[
+        pytest.param("polling"),
+        pytest.param(
+            "inotify",
+            marks=pytest.mark.skipif(
+                not InotifyWatcher.available(), reason="inotify is Linux only"
+            ),
+        ),
+    ]
+)
+def watcher(request, project: Path) -> Watcher:
+    watcher: Watcher
+    if request.param == "polling":
+        watcher = PollingWatcher(project, delay=0.05, interval=0.05)
+    else:
+        watcher = InotifyWatcher(project, delay=0.05)
+    watcher.start()
+    yield watcher
+    watcher.stop()
+
+
+def test_watcher_changes(watcher: Watcher, project: Path) -> None:
+    mod1 = project / "mod1.py"
+    mod1.write_text("myvar = None\n")
+    assert mod1 in wait_for_batches(watcher).changed
+    mod1.unlink()
+    assert mod1 in wait_for_batches(watcher).removed
+
+
+def test_observe(project: Path) -> None:
+    importer = AutoImport(project, observe=True)
+    try:
+        (project / "mod1.py").write_text("myvar = None\n")
+        deadline = time.monotonic() + 5
+        while not importer.search("myvar") and time.monotonic() < deadline:
+            time.sleep(0.05)
+            importer.sync()
+        assert [("from mod1 import myvar", "myvar")] == importer.search("myvar")
+    finally:
+        importer.close()
+
+
+def test_remove_deleted_package(importer: AutoImport, mod2: Path) -> None:
+    mod2.write_text("myvar = None\n")
+    importer.update_path(mod2)
+    mod2.unlink()
+    mod2.parent.rmdir()
+    importer.remove(mod2.parent)
+    assert [] == importer.search("myvar")